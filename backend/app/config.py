@@ -18,6 +18,12 @@ class Settings(BaseSettings):
     # Google Calendar Integration
     google_calendar_enabled: bool = True
     
+    # Shared cache for NHTSA lookups across instances (falls back to Firestore)
+    redis_url: Optional[str] = None
+    
+    # Prefetch popular vehicle makes from NHTSA on startup
+    nhtsa_warm_cache: bool = True
+    
     # Notification Configuration
     notification_enabled: bool = True
     
@@ -11,3 +11,11 @@ def get_client() -> firestore.Client:
         # In local dev without creds, let callers handle None
         print("Firestore client init failed:", err)
         return None
+
+@lru_cache
+def get_async_client() -> firestore.AsyncClient:
+    try:
+        return firestore.AsyncClient(project=settings.project_id or None)
+    except DefaultCredentialsError as err:
+        print("Firestore async client init failed:", err)
+        return None
@@ -1,13 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import api_router
 from .config import settings
 from .debug_secrets import router as debug_router
+from .services.nhtsa_service import nhtsa_service, POPULAR_MAKES
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Prefetch popular makes in the background so startup isn't delayed
+    warm_task = (
+        asyncio.create_task(nhtsa_service.warm_cache(POPULAR_MAKES))
+        if settings.nhtsa_warm_cache else None
+    )
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+    # Release pooled connections on shutdown
+    await nhtsa_service.aclose()
 
 app = FastAPI(
     title="Mechanic Booking API", 
     version="0.1.0",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # CORS configuration from settings
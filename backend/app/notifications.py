@@ -43,6 +43,7 @@ def prepare_email_notification_payload(
         "service_name": booking.service_name,
         "appointment_date": booking.slot_start.strftime("%Y-%m-%d"),
         "appointment_time": booking.slot_start.strftime("%H:%M"),
+        "duration_minutes": int((booking.slot_end - booking.slot_start).total_seconds() // 60),
         "customer_address": booking.customer_address,
         "customer_city": booking.customer_city,
         "customer_state": booking.customer_state,
@@ -4,6 +4,7 @@ from typing import Optional
 from ..models import Slot, Mechanic
 from ..utils.slots import build_slots
 from ..firestore import get_client
+from ..services.booking_service import booked_slot_times
 
 router = APIRouter(prefix="/availability", tags=["availability"])
 
@@ -67,24 +68,29 @@ async def _generate_availability_for_day(db, day: date, service_id: Optional[str
     day_start = datetime.combine(day, datetime.min.time())
     day_end = datetime.combine(day, datetime.max.time())
     
+    # Filter status in Python: a status filter on this range query would need a
+    # (status, slot_start) composite index, which firestore.indexes.json does not declare
     bookings_query = db.collection("bookings").where(
         "slot_start", ">=", day_start
     ).where(
         "slot_start", "<=", day_end
-    ).where(
-        "status", "in", ["pending", "confirmed"]
     ).stream()
     
     for booking_doc in bookings_query:
         booking_data = booking_doc.to_dict()
+        if booking_data.get("status") not in ("pending", "confirmed"):
+            continue
         booking_start = booking_data["slot_start"]
         if isinstance(booking_start, str):
             booking_start = datetime.fromisoformat(booking_start.replace('Z', '+00:00'))
+        booking_end = booking_data.get("slot_end")
+        if isinstance(booking_end, str):
+            booking_end = datetime.fromisoformat(booking_end.replace('Z', '+00:00'))
         
-        # Mark the corresponding slot as booked
-        time_str = booking_start.strftime("%H:%M")
-        if time_str in all_slots:
-            all_slots[time_str]["status"] = "booked"
+        # Mark every slot the booking covers as booked
+        for time_str in booked_slot_times(booking_start, booking_end):
+            if time_str in all_slots:
+                all_slots[time_str]["status"] = "booked"
     
     # Convert to Slot objects
     slots = []
@@ -10,7 +10,7 @@ from ..firestore import get_client
 from ..auth import get_current_user, get_admin_user, get_mechanic_user
 from ..notifications import send_booking_notification
 from ..google_calendar import delete_event
-from ..services.booking_service import BookingError, SlotUnavailableError, ServiceNotFoundError
+from ..services.booking_service import BookingError, SlotUnavailableError, ServiceNotFoundError, ACTIVE_BOOKING_STATUSES, booked_slot_times, held_slot_claims, slot_claim_refs
 from uuid import uuid4
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
@@ -125,7 +125,8 @@ async def create_booking(
         booking_service = BookingService()
         booking = await booking_service.create_booking(payload)
         
-        # Add background task for notifications
+        # Sync the calendar and send notifications after responding
+        background_tasks.add_task(booking_service.sync_calendar_event, booking)
         background_tasks.add_task(send_booking_notification, booking)
         
         return booking
@@ -229,13 +230,35 @@ async def update_booking_status(
         doc = booking_ref.get(transaction=transaction)
         if not doc.exists:
             return None
-            
+        
+        booking_data = doc.to_dict()
+        was_active = booking_data.get("status") in ACTIVE_BOOKING_STATUSES
+        is_active = status in ACTIVE_BOOKING_STATUSES
+        
+        # Reactivating a booking must win its slot claims back first
+        claim_refs = slot_claim_refs(db, booking_data)
+        if is_active and not was_active:
+            for claim in db.get_all(claim_refs, transaction=transaction):
+                if claim.exists and claim.to_dict().get("booking_id") != booking_id:
+                    raise HTTPException(409, "Time slot has been booked by another booking")
+        
+        # Deactivating releases only the claims this booking still holds
+        if was_active and not is_active:
+            claim_refs = held_slot_claims(db, transaction, booking_id, booking_data)
+        
         # Update the status
         transaction.update(booking_ref, {
             "status": status,
             "updated_at": firestore.SERVER_TIMESTAMP
         })
         
+        # Keep the mechanic's slot claims in step with whether the booking holds its slots
+        for claim_ref in claim_refs:
+            if was_active and not is_active:
+                transaction.delete(claim_ref)
+            elif is_active and not was_active:
+                transaction.set(claim_ref, {"booking_id": booking_id})
+        
         # Return success
         return True
     
@@ -276,6 +299,16 @@ async def approve_or_deny_booking(
         
         booking_data = doc.to_dict()
         
+        # Denying an active booking frees its slots; read its availability document
+        # and the slot claims it still holds before any writes
+        releases_slots = not approval.approved and booking_data.get("status") in ACTIVE_BOOKING_STATUSES
+        if releases_slots:
+            slot_date = booking_data["slot_start"].date().isoformat()
+            slot_times = booked_slot_times(booking_data["slot_start"], booking_data.get("slot_end"))
+            avail_ref = db.collection("availability").document(slot_date)
+            avail_doc = avail_ref.get(transaction=transaction)
+            claim_refs = held_slot_claims(db, transaction, booking_id, booking_data)
+        
         # Set the new status based on approval decision
         new_status = BookingStatus.CONFIRMED.value if approval.approved else BookingStatus.DENIED.value
         
@@ -329,23 +362,20 @@ async def approve_or_deny_booking(
             transaction.set(work_order_ref, work_order_data)
             logger.info(f"Auto-created work order {work_order_number} for approved booking {booking_id}")
         
-        # If we're denying the booking, we need to mark the slot as free again
-        elif not approval.approved:
-            # Get the slot from availability
-            slot_date = booking_data["slot_start"].date().isoformat()
-            slot_time = booking_data["slot_start"].strftime("%H:%M")
-            
-            # Read the availability document
-            avail_ref = db.collection("availability").document(slot_date)
-            avail_doc = avail_ref.get(transaction=transaction)
+        # If we're denying an active booking, we need to mark its slots as free again
+        elif releases_slots:
+            # Release the mechanic's slot claims
+            for claim_ref in claim_refs:
+                transaction.delete(claim_ref)
             
             if avail_doc.exists:
                 avail_data = avail_doc.to_dict()
                 slots = avail_data.get("slots", {})
                 
-                # Only update if the slot is currently booked
-                if slots.get(slot_time) == SlotStatus.BOOKED.value:
-                    slots[slot_time] = SlotStatus.FREE.value
+                # Only update if a covered slot is currently booked
+                booked = [slot_time for slot_time in slot_times if slots.get(slot_time) == SlotStatus.BOOKED.value]
+                if booked:
+                    slots.update(dict.fromkeys(booked, SlotStatus.FREE.value))
                     transaction.update(avail_ref, {
                         "slots": slots,
                         "updated_at": firestore.SERVER_TIMESTAMP
@@ -472,10 +502,11 @@ async def cancel_booking(
         
         # Read the availability document before any writes
         slot_date = booking_data["slot_start"].date().isoformat()
-        slot_time = booking_data["slot_start"].strftime("%H:%M")
+        slot_times = booked_slot_times(booking_data["slot_start"], booking_data.get("slot_end"))
         
         avail_ref = db.collection("availability").document(slot_date)
         avail_doc = avail_ref.get(transaction=transaction)
+        claim_refs = held_slot_claims(db, transaction, booking_id, booking_data)
         
         # Now perform all writes
         # Update the booking
@@ -488,14 +519,19 @@ async def cancel_booking(
         
         transaction.update(booking_ref, update_data)
         
-        # Mark the slot as available again
+        # Release the mechanic's slot claims
+        for claim_ref in claim_refs:
+            transaction.delete(claim_ref)
+        
+        # Mark the slots as available again
         if avail_doc.exists:
             avail_data = avail_doc.to_dict()
             slots = avail_data.get("slots", {})
             
-            # Update slot to free if it was booked
-            if slots.get(slot_time) == SlotStatus.BOOKED.value:
-                slots[slot_time] = SlotStatus.FREE.value
+            # Update covered slots to free if they were booked
+            booked = [slot_time for slot_time in slot_times if slots.get(slot_time) == SlotStatus.BOOKED.value]
+            if booked:
+                slots.update(dict.fromkeys(booked, SlotStatus.FREE.value))
                 transaction.update(avail_ref, {
                     "slots": slots,
                     "updated_at": firestore.SERVER_TIMESTAMP
@@ -565,6 +601,9 @@ async def request_reschedule(
         if current_status not in [BookingStatus.PENDING.value, BookingStatus.CONFIRMED.value]:
             raise HTTPException(400, f"Cannot reschedule booking with status: {current_status}")
         
+        # Read the slot claims the booking still holds before any writes
+        claim_refs = held_slot_claims(db, transaction, booking_id, booking_data)
+        
         # Convert preferred slots to dict format for Firestore
         preferred_slots_data = []
         for slot in reschedule_request.preferred_slots:
@@ -585,6 +624,10 @@ async def request_reschedule(
         
         transaction.update(booking_ref, update_data)
         
+        # Availability no longer counts the booking against its slots, so release the claims too
+        for claim_ref in claim_refs:
+            transaction.delete(claim_ref)
+        
         return booking_data
     
     # Execute the transaction
@@ -1,32 +1,69 @@
 """
 Simplified booking service with cleaner separation of concerns
 """
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 from google.cloud import firestore
 from google.api_core import exceptions as google_exceptions
 import logging
 import tenacity
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import stop_after_attempt, wait_random_exponential, retry_if_exception_type
 
-from ..models import BookingCreate, BookingOut, BookingStatus, SlotStatus
-from ..firestore import get_client
-from ..notifications import send_booking_notification
+from ..models import BookingCreate, BookingOut, BookingStatus, Slot, SlotStatus
+from ..firestore import get_client, get_async_client
+from ..utils.slots import covered_slots
 from ..google_calendar import create_event
 from ..utils.service_area import validate_service_area, ServiceAreaError
 from google.api_core.exceptions import GoogleAPIError
 
 logger = logging.getLogger(__name__)
 
-# Retry configuration for transient Firestore errors
+# Retry configuration for transient Firestore errors. Jitter keeps concurrent
+# callers from retrying in lockstep; BookingError subclasses (e.g. slot
+# conflicts) are never retried.
 retry_config = {
-    'stop': stop_after_attempt(3),
-    'wait': wait_exponential(multiplier=1, min=1, max=10),
-    'retry': retry_if_exception_type((google_exceptions.ServiceUnavailable, 
-                                      google_exceptions.DeadlineExceeded)),
+    'stop': stop_after_attempt(5),
+    'wait': wait_random_exponential(multiplier=0.1, max=5),
+    'retry': retry_if_exception_type((google_exceptions.Aborted,
+                                      google_exceptions.Cancelled,
+                                      google_exceptions.Unknown,
+                                      google_exceptions.DeadlineExceeded,
+                                      google_exceptions.InternalServerError,
+                                      google_exceptions.ServiceUnavailable,
+                                      google_exceptions.ResourceExhausted)),
     'reraise': True,
 }
 
+# Length of one availability slot, matching build_slots' default granularity
+SLOT_MINUTES = 30
+
+def booking_slot_key(booking_date: str, booking_time: str, mechanic_id: Optional[str]) -> str:
+    """Document id in `booking_slots` claiming a mechanic's time slot"""
+    return f"{booking_date}_{booking_time}_{mechanic_id or 'unassigned'}"
+
+def booked_slot_times(slot_start: datetime, slot_end: Optional[datetime]) -> List[str]:
+    """HH:MM of every slot a booking holds, from its start up to its end"""
+    minutes = int((slot_end - slot_start).total_seconds()) // 60 if slot_end else SLOT_MINUTES
+    return covered_slots(f"{slot_start.hour:02d}:{slot_start.minute:02d}", minutes, SLOT_MINUTES)
+
+def slot_claim_refs(db: firestore.Client, booking_data: dict) -> List[firestore.DocumentReference]:
+    """References to the `booking_slots` claims held by a booking, one per slot it covers"""
+    slot_start = booking_data["slot_start"]
+    booking_date = slot_start.date().isoformat()
+    return [
+        db.collection("booking_slots").document(booking_slot_key(booking_date, slot_time, booking_data.get("mechanic_id")))
+        for slot_time in booked_slot_times(slot_start, booking_data.get("slot_end"))
+    ]
+
+def held_slot_claims(db: firestore.Client, transaction: firestore.Transaction, booking_id: str, booking_data: dict) -> List[firestore.DocumentReference]:
+    """Read a booking's slot claims in a transaction and return the ones it still holds"""
+    claims = db.get_all(slot_claim_refs(db, booking_data), transaction=transaction)
+    return [claim.reference for claim in claims if claim.exists and claim.to_dict().get("booking_id") == booking_id]
+
+# Statuses whose bookings hold their slot (and its booking_slots claim)
+ACTIVE_BOOKING_STATUSES = frozenset({BookingStatus.PENDING.value, BookingStatus.CONFIRMED.value})
+
 class BookingError(Exception):
     """Base exception for booking errors."""
     pass
@@ -43,22 +80,23 @@ class BookingService:
     """Simplified booking service with clean methods"""
     
     def __init__(self):
+        # Sync client for transactions, async client for everything else
         self.db = get_client()
-        if not self.db:
+        self.async_db = get_async_client()
+        if not self.db or not self.async_db:
             raise RuntimeError("Database client unavailable")
     
-    def get_service(self, service_id: str) -> dict:
+    async def get_service(self, service_id: str) -> dict:
         """Get service details by ID"""
-        service_ref = self.db.collection("services").document(service_id)
-        service_doc = service_ref.get()
+        service_ref = self.async_db.collection("services").document(service_id)
+        service_doc = await service_ref.get()
         if not service_doc.exists:
             raise ServiceNotFoundError(f"Service {service_id} not found")
         return service_doc.to_dict()
     
-    async def validate_availability(self, payload: BookingCreate, service_duration: int) -> Optional[str]:
-        """Validate slot availability and return mechanic_id if available"""
+    async def validate_availability(self, payload: BookingCreate, booking_time: str) -> Dict[str, Slot]:
+        """Check the starting slot is free and return the day's slots keyed by HH:MM"""
         booking_date = payload.slot_start.date()
-        booking_time = payload.slot_start.strftime("%H:%M")
         
         # Import availability function
         from ..routers.availability import _generate_availability_for_day
@@ -66,17 +104,22 @@ class BookingService:
         # Check if slot is available
         available_slots = await _generate_availability_for_day(self.db, booking_date, payload.service_id)
         
-        for slot in available_slots:
-            slot_time = datetime.fromisoformat(slot.start.replace('Z', '')).strftime("%H:%M")
-            if slot_time == booking_time and slot.is_free:
-                return slot.mechanic_id
+        # Slot starts are "YYYY-MM-DDTHH:MM:SS", so the HH:MM key is a fixed slice
+        slots_by_time = {slot.start[11:16]: slot for slot in available_slots}
         
-        raise SlotUnavailableError(f"Time slot {booking_time} is not available")
+        self.check_slots_free(slots_by_time, [booking_time])
+        return slots_by_time
     
+    def check_slots_free(self, slots_by_time: Dict[str, Slot], slot_times: List[str]) -> None:
+        """Raise SlotUnavailableError unless every given slot is free"""
+        for slot_time in slot_times:
+            slot = slots_by_time.get(slot_time)
+            if not (slot and slot.is_free):
+                raise SlotUnavailableError(f"Time slot {slot_time} is not available")
     
     def create_booking_data(self, payload: BookingCreate, service: dict) -> dict:
         """Create the booking data dictionary"""
-        service_duration = service.get("minutes", 30)
+        service_duration = service.get("minutes", SLOT_MINUTES)
         slot_end = payload.slot_start + timedelta(minutes=service_duration)
         
         booking_data = payload.model_dump()
@@ -91,32 +134,49 @@ class BookingService:
         
         return booking_data
     
-    def update_availability_cache(self, transaction: firestore.Transaction, booking_data: dict, db_client: firestore.Client, availability_snapshot):
+    def update_availability_cache(self, transaction: firestore.Transaction, booking_data: dict, slot_doc, booking_date: str, slot_times: List[str], availability_snapshot):
         """Update the availability cache document using pre-read data"""
-        booking_date = booking_data["slot_start"].date().isoformat()
-        booking_time = booking_data["slot_start"].strftime("%H:%M")
-        
-        slot_doc = db_client.collection("availability").document(booking_date)
-        
         if availability_snapshot and availability_snapshot.exists:
-            # Update existing availability cache
-            availability_data = availability_snapshot.to_dict()
-            slots = availability_data.get("slots", {})
-            slots[booking_time] = SlotStatus.BOOKED.value
+            # Update only the booked slots rather than rewriting the whole map
             transaction.update(slot_doc, {
-                "slots": slots,
+                **{f"slots.`{slot_time}`": SlotStatus.BOOKED.value for slot_time in slot_times},
                 "updated_at": firestore.SERVER_TIMESTAMP
             })
         else:
             # Create minimal availability document
-            transaction.set(slot_doc, {
-                "day": booking_date,
-                "slots": {booking_time: SlotStatus.BOOKED.value},
-                "mechanics": {booking_data["mechanic_id"]: True} if booking_data.get("mechanic_id") else {},
-                "generated_dynamically": True,
-                "created_at": firestore.SERVER_TIMESTAMP,
-                "updated_at": firestore.SERVER_TIMESTAMP,
-            })
+            transaction.set(slot_doc, self.create_availability_data(booking_data, booking_date, slot_times))
+    
+    def create_availability_data(self, booking_data: dict, booking_date: str, slot_times: List[str]) -> dict:
+        """Create a minimal availability document for a day with no cached slots"""
+        return {
+            "day": booking_date,
+            "slots": dict.fromkeys(slot_times, SlotStatus.BOOKED.value),
+            "mechanics": {booking_data["mechanic_id"]: True} if booking_data.get("mechanic_id") else {},
+            "generated_dynamically": True,
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }
+    
+    def create_booking_batch(self, booking_ref, booking_data: dict, slot_doc, claim_refs, booking_date: str, slot_times: List[str]) -> bool:
+        """Commit the first booking of a day in a single batched write.
+        
+        Returns False if an availability document already exists, in which
+        case the caller must fall back to the transactional path.
+        """
+        if slot_doc.get().exists:
+            return False
+        
+        batch = self.db.batch()
+        batch.set(booking_ref, booking_data)
+        # create() fails the whole batch if another booking got there first
+        for claim_ref in claim_refs:
+            batch.create(claim_ref, {"booking_id": booking_ref.id})
+        batch.create(slot_doc, self.create_availability_data(booking_data, booking_date, slot_times))
+        try:
+            batch.commit()
+        except google_exceptions.AlreadyExists:
+            return False
+        return True
     
     @tenacity.retry(**retry_config)
     async def create_booking(self, payload: BookingCreate) -> BookingOut:
@@ -127,54 +187,63 @@ class BookingService:
         except ServiceAreaError as e:
             raise BookingError(str(e))
         
-        # 2. Get service details
-        service = self.get_service(payload.service_id)
+        # Format the slot's date and time once for all helpers
+        slot_start = payload.slot_start
+        booking_date = slot_start.date().isoformat()
+        booking_time = f"{slot_start.hour:02d}:{slot_start.minute:02d}"
+        
+        # 2. Get service details and pre-check the starting slot concurrently
+        service, slots_by_time = await asyncio.gather(
+            self.get_service(payload.service_id),
+            self.validate_availability(payload, booking_time),
+        )
         
-        # 3. Validate availability and get mechanic
-        mechanic_id = await self.validate_availability(payload, service.get("minutes", 30))
+        # Services longer than one slot also need the following slots free
+        slot_times = covered_slots(booking_time, service.get("minutes", SLOT_MINUTES), SLOT_MINUTES)
+        self.check_slots_free(slots_by_time, slot_times[1:])
+        
+        # 3. Assign the mechanic returned by the availability check
+        mechanic_id = slots_by_time[booking_time].mechanic_id
         if mechanic_id:
             payload.mechanic_id = mechanic_id
         
-        # 4. Create booking data
+        # 4. Create booking data; the booking claims every slot it covers
         booking_data = self.create_booking_data(payload, service)
         booking_ref = self.db.collection("bookings").document()
+        slot_doc = self.db.collection("availability").document(booking_date)
+        claim_refs = slot_claim_refs(self.db, booking_data)
         
         # 5. Execute transaction with read-before-write pattern
         @firestore.transactional
         def txn(transaction: firestore.Transaction):
             # READS FIRST: Read availability document before any writes
-            booking_date = booking_data["slot_start"].date().isoformat()
-            slot_doc = self.db.collection("availability").document(booking_date)
             availability_snapshot = slot_doc.get(transaction=transaction)
+            slot_claims = self.db.get_all(claim_refs, transaction=transaction)
             
-            # Check for conflicts (this may involve reads, so do it early)
-            existing_bookings = self.db.collection("bookings").where(
-                "slot_start", "==", payload.slot_start
-            ).where(
-                "status", "in", ["pending", "confirmed"]
-            ).get(transaction=transaction)
-            
-            # Validate no conflicts exist
-            for existing_booking in existing_bookings:
-                existing_data = existing_booking.to_dict()
-                if existing_data.get("mechanic_id") == mechanic_id:
-                    raise SlotUnavailableError("Time slot is already booked")
+            # The mechanic's slot claims are the conflict guard; the day cache is shared
+            # by all mechanics, so a booked slot there is not a conflict by itself
+            if any(slot_claim.exists for slot_claim in slot_claims):
+                raise SlotUnavailableError("Time slot is already booked")
             
             # WRITES SECOND: Now perform all write operations
-            # Create booking
+            # Create booking and claim the mechanic's slots
             transaction.set(booking_ref, booking_data)
+            for claim_ref in claim_refs:
+                transaction.set(claim_ref, {"booking_id": booking_ref.id})
             
             # Update availability cache using pre-read data
-            self.update_availability_cache(transaction, booking_data, self.db, availability_snapshot)
+            self.update_availability_cache(transaction, booking_data, slot_doc, booking_date, slot_times, availability_snapshot)
             
             return True
         
-        # Execute transaction
-        txn(self.db.transaction())
+        # Execute transaction, unless this is the day's first booking and
+        # a single batched write suffices. Both run off the event loop.
+        if not await asyncio.to_thread(self.create_booking_batch, booking_ref, booking_data, slot_doc, claim_refs, booking_date, slot_times):
+            await asyncio.to_thread(txn, self.db.transaction())
         
         # 6. Create response object
         booking_id = booking_ref.id
-        booking_doc = self.db.collection("bookings").document(booking_id).get()
+        booking_doc = await self.async_db.collection("bookings").document(booking_id).get()
         
         if not booking_doc.exists:
             raise BookingError("Booking creation failed")
@@ -184,16 +253,14 @@ class BookingService:
         response_data["created_at"] = current_time
         response_data["updated_at"] = current_time
         
-        booking_out = BookingOut(id=booking_id, **response_data)
-        
-        # 7. Add calendar event (best effort)
+        return BookingOut(id=booking_id, **response_data)
+    
+    def sync_calendar_event(self, booking: BookingOut) -> None:
+        """Add a calendar event for the booking (best effort, run as a background task)"""
         try:
-            calendar_event_id = create_event(booking_out)
-            self.db.collection("bookings").document(booking_id).update({
+            calendar_event_id = create_event(booking)
+            self.db.collection("bookings").document(booking.id).update({
                 "calendar_event_id": calendar_event_id
             })
-            booking_out.calendar_event_id = calendar_event_id
         except GoogleAPIError as e:
-            logger.error("Calendar sync failed for booking %s: %s", booking_id, e.message)
-        
-        return booking_out
+            logger.error("Calendar sync failed for booking %s: %s", booking.id, e.message)
@@ -1,42 +1,161 @@
 import httpx
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import re
+import time
+from urllib.parse import quote
+from typing import Any, Iterable, List, Dict, Optional, Tuple
+from datetime import datetime, timezone
+from collections import defaultdict
 import asyncio
+import orjson
+import redis.asyncio as aioredis
+from cachetools import LRUCache, TLRUCache
+
+from ..config import settings
+from ..firestore import get_client
 
 logger = logging.getLogger(__name__)
 
+NHTSA_BASE_URL = "https://vpic.nhtsa.dot.gov/api"
+
+# Shared connection pool for all NHTSA calls in this process. HTTP/2 is negotiated
+# via ALPN so concurrent calls multiplex over one connection; httpx falls back to
+# HTTP/1.1 keep-alive if the server does not offer it.
+_client = httpx.AsyncClient(
+    base_url=NHTSA_BASE_URL,
+    http2=True,
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+)
+
+# Optional Redis shared across instances; the Firestore cache is used otherwise
+_redis: Optional[aioredis.Redis] = (
+    aioredis.from_url(settings.redis_url) if settings.redis_url else None
+)
+
+# Makes whose models are prefetched at startup
+POPULAR_MAKES: Tuple[str, ...] = (
+    "Toyota", "Honda", "Ford", "Chevrolet", "Nissan",
+    "Hyundai", "Kia", "Jeep", "BMW", "Mercedes-Benz",
+)
+
+# Curated list of the 37 most common vehicle makes ordered alphabetically
+_CURATED_MAKES: Tuple[Dict[str, Any], ...] = (
+    {"Make_ID": 22, "Make_Name": "Acura"},
+    {"Make_ID": 30, "Make_Name": "Alfa Romeo"},
+    {"Make_ID": 18, "Make_Name": "Audi"},
+    {"Make_ID": 32, "Make_Name": "Bentley"},
+    {"Make_ID": 13, "Make_Name": "BMW"},
+    {"Make_ID": 21, "Make_Name": "Buick"},
+    {"Make_ID": 19, "Make_Name": "Cadillac"},
+    {"Make_ID": 3, "Make_Name": "Chevrolet"},
+    {"Make_ID": 20, "Make_Name": "Chrysler"},
+    {"Make_ID": 17, "Make_Name": "Dodge"},
+    {"Make_ID": 34, "Make_Name": "Fiat"},
+    {"Make_ID": 2, "Make_Name": "Ford"},
+    {"Make_ID": 11, "Make_Name": "GMC"},
+    {"Make_ID": 27, "Make_Name": "Genesis"},
+    {"Make_ID": 4, "Make_Name": "Honda"},
+    {"Make_ID": 5, "Make_Name": "Hyundai"},
+    {"Make_ID": 28, "Make_Name": "INFINITI"},
+    {"Make_ID": 7, "Make_Name": "Jeep"},
+    {"Make_ID": 6, "Make_Name": "Kia"},
+    {"Make_ID": 33, "Make_Name": "Lamborghini"},
+    {"Make_ID": 16, "Make_Name": "Lexus"},
+    {"Make_ID": 25, "Make_Name": "Lincoln"},
+    {"Make_ID": 29, "Make_Name": "MINI"},
+    {"Make_ID": 35, "Make_Name": "McLaren"},
+    {"Make_ID": 31, "Make_Name": "Maserati"},
+    {"Make_ID": 15, "Make_Name": "Mazda"},
+    {"Make_ID": 12, "Make_Name": "Mercedes-Benz"},
+    {"Make_ID": 24, "Make_Name": "Mitsubishi"},
+    {"Make_ID": 8, "Make_Name": "Nissan"},
+    {"Make_ID": 26, "Make_Name": "Porsche"},
+    {"Make_ID": 10, "Make_Name": "Ram"},
+    {"Make_ID": 36, "Make_Name": "Rolls-Royce"},
+    {"Make_ID": 9, "Make_Name": "Subaru"},
+    {"Make_ID": 37, "Make_Name": "Tesla"},
+    {"Make_ID": 1, "Make_Name": "Toyota"},
+    {"Make_ID": 14, "Make_Name": "Volkswagen"},
+    {"Make_ID": 23, "Make_Name": "Volvo"},
+)
+
+# Common models for popular makes, served when the NHTSA API fails
+_FALLBACK_MODELS: Dict[str, List[Dict[str, Any]]] = {
+    "Honda": [
+        {"Model_ID": 1, "Model_Name": "Accord", "Make_ID": 4, "Make_Name": "Honda"},
+        {"Model_ID": 2, "Model_Name": "Civic", "Make_ID": 4, "Make_Name": "Honda"},
+        {"Model_ID": 3, "Model_Name": "CR-V", "Make_ID": 4, "Make_Name": "Honda"},
+        {"Model_ID": 4, "Model_Name": "Pilot", "Make_ID": 4, "Make_Name": "Honda"},
+        {"Model_ID": 5, "Model_Name": "Odyssey", "Make_ID": 4, "Make_Name": "Honda"},
+    ],
+    "Toyota": [
+        {"Model_ID": 1, "Model_Name": "Camry", "Make_ID": 1, "Make_Name": "Toyota"},
+        {"Model_ID": 2, "Model_Name": "Corolla", "Make_ID": 1, "Make_Name": "Toyota"},
+        {"Model_ID": 3, "Model_Name": "RAV4", "Make_ID": 1, "Make_Name": "Toyota"},
+        {"Model_ID": 4, "Model_Name": "Highlander", "Make_ID": 1, "Make_Name": "Toyota"},
+        {"Model_ID": 5, "Model_Name": "Prius", "Make_ID": 1, "Make_Name": "Toyota"},
+    ],
+    "Ford": [
+        {"Model_ID": 1, "Model_Name": "F-150", "Make_ID": 2, "Make_Name": "Ford"},
+        {"Model_ID": 2, "Model_Name": "Escape", "Make_ID": 2, "Make_Name": "Ford"},
+        {"Model_ID": 3, "Model_Name": "Explorer", "Make_ID": 2, "Make_Name": "Ford"},
+        {"Model_ID": 4, "Model_Name": "Mustang", "Make_ID": 2, "Make_Name": "Ford"},
+        {"Model_ID": 5, "Model_Name": "Focus", "Make_ID": 2, "Make_Name": "Ford"},
+    ],
+    "Chevrolet": [
+        {"Model_ID": 1, "Model_Name": "Silverado", "Make_ID": 3, "Make_Name": "Chevrolet"},
+        {"Model_ID": 2, "Model_Name": "Equinox", "Make_ID": 3, "Make_Name": "Chevrolet"},
+        {"Model_ID": 3, "Model_Name": "Malibu", "Make_ID": 3, "Make_Name": "Chevrolet"},
+        {"Model_ID": 4, "Model_Name": "Tahoe", "Make_ID": 3, "Make_Name": "Chevrolet"},
+        {"Model_ID": 5, "Model_Name": "Cruze", "Make_ID": 3, "Make_Name": "Chevrolet"},
+    ],
+}
+
+def _entry_expiry(_key: str, entry: Tuple[List[Dict[str, Any]], float], _now: float) -> float:
+    """Each cache entry carries its own monotonic expiry time"""
+    return entry[1]
+
 class NHTSAService:
     """Service to interact with NHTSA Vehicle API"""
     
-    BASE_URL = "https://vpic.nhtsa.dot.gov/api"
-    CACHE_DURATION = timedelta(hours=24)  # Cache for 24 hours
+    BASE_URL = NHTSA_BASE_URL
+    CACHE_DURATION_SECONDS = 86400.0  # Cache for 24 hours
     
     def __init__(self):
-        self._makes_cache: Optional[Dict] = None
-        self._makes_cache_time: Optional[datetime] = None
-        self._models_cache: Dict[str, Dict] = {}
-        self._models_cache_time: Dict[str, datetime] = {}
+        # Entries are (models, expires_at) on the monotonic clock, so freshness
+        # is immune to wall-clock jumps
+        self._models_cache: TLRUCache = TLRUCache(maxsize=128, ttu=_entry_expiry, timer=time.monotonic)
+        # Last good payload per make, kept past expiry to serve while
+        # revalidating and when NHTSA is unavailable
+        self._stale_models: LRUCache = LRUCache(maxsize=128)
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        # One lock per make so concurrent misses share a single upstream fetch
+        self._models_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP and Redis clients"""
+        await _client.aclose()
+        if _redis is not None:
+            await _redis.aclose()
+    
+    async def warm_cache(self, makes: Iterable[str], concurrency: int = 5) -> None:
+        """Prefetch models for the given makes, at most `concurrency` at a time"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def warm(make_name: str) -> None:
+            async with semaphore:
+                await self.get_models_for_make(make_name)
+        
+        await asyncio.gather(*(warm(make) for make in makes), return_exceptions=True)
+        logger.info(f"Warmed NHTSA model cache for {len(self._models_cache)} makes")
     
     async def get_all_makes(self) -> List[Dict[str, str]]:
         """
-        Get curated list of the 36 most common vehicle makes
-        Returns list of dicts with 'Make_ID' and 'Make_Name' ordered by sales volume
+        Get curated list of the 37 most common vehicle makes
+        Returns list of dicts with 'Make_ID' and 'Make_Name' ordered alphabetically
         """
-        # Check cache first
-        if (self._makes_cache and self._makes_cache_time and 
-            datetime.now() - self._makes_cache_time < self.CACHE_DURATION):
-            return self._makes_cache
-        
-        # Use curated list of top 36 makes by sales volume
-        makes = self._get_curated_makes()
-        
-        # Cache the results
-        self._makes_cache = makes
-        self._makes_cache_time = datetime.now()
-        
-        logger.info(f"Returning curated list of {len(makes)} most common vehicle makes")
-        return makes
+        return _CURATED_MAKES
     
     async def get_models_for_make(self, make_name: str) -> List[Dict[str, str]]:
         """
@@ -45,32 +164,156 @@ class NHTSAService:
         """
         # Check cache first
         cache_key = make_name.lower()
-        if (cache_key in self._models_cache and 
-            cache_key in self._models_cache_time and
-            datetime.now() - self._models_cache_time[cache_key] < self.CACHE_DURATION):
-            return self._models_cache[cache_key]
+        cached = self._get_cached_models(cache_key)
+        if cached is not None:
+            return cached
+        
+        stale = self._stale_models.get(cache_key)
+        if stale is not None:
+            # Serve the expired entry now and refresh it in the background
+            self._schedule_refresh(make_name, cache_key)
+            return stale
+        
+        return await self._fetch_models_once(make_name, cache_key)
+    
+    def _schedule_refresh(self, make_name: str, cache_key: str) -> None:
+        """Start a background refresh for a make unless one is already running"""
+        if cache_key in self._refresh_tasks:
+            return
+        task = asyncio.create_task(self._fetch_models_once(make_name, cache_key))
+        self._refresh_tasks[cache_key] = task
+        task.add_done_callback(lambda _task: self._refresh_tasks.pop(cache_key, None))
+    
+    async def _fetch_models_once(self, make_name: str, cache_key: str) -> List[Dict[str, str]]:
+        """Fetch models for a make, coalescing concurrent callers"""
+        async with self._models_locks[cache_key]:
+            # Another request may have filled the cache while we waited
+            cached = self._get_cached_models(cache_key)
+            if cached is not None:
+                return cached
+            try:
+                return await self._fetch_models(make_name, cache_key)
+            finally:
+                # Drop the lock once the entry is cached so the lock map stays
+                # bounded; current waiters keep their reference and hit the cache
+                self._models_locks.pop(cache_key, None)
+    
+    def _get_cached_models(self, cache_key: str) -> Optional[List[Dict[str, str]]]:
+        """Return cached models for a make if still fresh"""
+        entry = self._models_cache.get(cache_key)
+        return entry[0] if entry is not None else None
+    
+    def _cache_models(self, cache_key: str, models: List[Dict[str, str]], ttl: float) -> None:
+        """Cache models for a make for ttl seconds"""
+        self._models_cache[cache_key] = (models, time.monotonic() + ttl)
+        self._stale_models[cache_key] = models
+    
+    def _persisted_models_ref(self, cache_key: str):
+        """Firestore document holding the shared cache entry for a make"""
+        db = get_client()
+        if not db:
+            return None
+        slug = re.sub(r"[^a-z0-9]+", "_", cache_key)
+        return db.collection("cache").document(f"nhtsa_models_{slug}")
+    
+    def _read_persisted_models(self, cache_key: str) -> Optional[List[Dict[str, str]]]:
+        """Hydrate the in-memory cache from Firestore so cold starts skip NHTSA"""
+        try:
+            doc_ref = self._persisted_models_ref(cache_key)
+            if doc_ref is None:
+                return None
+            doc = doc_ref.get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            age = (datetime.now(timezone.utc) - data["fetched_at"]).total_seconds()
+            if age >= self.CACHE_DURATION_SECONDS:
+                return None
+        except Exception as e:
+            logger.warning(f"Could not read persisted models for make '{cache_key}': {e}")
+            return None
+        
+        # Keep only the entry's remaining lifetime
+        models = data.get("data", [])
+        self._cache_models(cache_key, models, self.CACHE_DURATION_SECONDS - age)
+        return models
+    
+    def _persist_models(self, cache_key: str, models: List[Dict[str, str]]) -> None:
+        """Best-effort write of fetched models to the shared Firestore cache"""
+        try:
+            doc_ref = self._persisted_models_ref(cache_key)
+            if doc_ref is not None:
+                doc_ref.set({"data": models, "fetched_at": datetime.now(timezone.utc)})
+        except Exception as e:
+            logger.warning(f"Could not persist models for make '{cache_key}': {e}")
+    
+    async def _read_redis_models(self, cache_key: str) -> Optional[List[Dict[str, str]]]:
+        """Hydrate the in-memory cache from Redis so cold starts skip NHTSA"""
+        try:
+            async with _redis.pipeline(transaction=False) as pipe:
+                pipe.get(f"nhtsa:models:{cache_key}")
+                pipe.ttl(f"nhtsa:models:{cache_key}")
+                raw, ttl = await pipe.execute()
+        except aioredis.RedisError as e:
+            logger.warning(f"Could not read cached models for make '{cache_key}' from Redis: {e}")
+            return None
+        if raw is None or ttl <= 0:
+            return None
+        
+        models = orjson.loads(raw)
+        self._cache_models(cache_key, models, ttl)
+        return models
+    
+    async def _write_redis_models(self, cache_key: str, models: List[Dict[str, str]]) -> None:
+        """Best-effort write of fetched models to the shared Redis cache"""
+        try:
+            await _redis.set(
+                f"nhtsa:models:{cache_key}",
+                orjson.dumps(models),
+                ex=int(self.CACHE_DURATION_SECONDS),
+            )
+        except aioredis.RedisError as e:
+            logger.warning(f"Could not cache models for make '{cache_key}' in Redis: {e}")
+    
+    async def _read_shared_models(self, cache_key: str) -> Optional[List[Dict[str, str]]]:
+        """Read models from the cross-instance cache (Redis if configured, else Firestore)"""
+        if _redis is not None:
+            return await self._read_redis_models(cache_key)
+        return await asyncio.to_thread(self._read_persisted_models, cache_key)
+    
+    async def _write_shared_models(self, cache_key: str, models: List[Dict[str, str]]) -> None:
+        """Write models to the cross-instance cache (Redis if configured, else Firestore)"""
+        if _redis is not None:
+            await self._write_redis_models(cache_key, models)
+        else:
+            await asyncio.to_thread(self._persist_models, cache_key, models)
+    
+    async def _fetch_models(self, make_name: str, cache_key: str) -> List[Dict[str, str]]:
+        """Fetch models for a make from the shared cache or NHTSA and cache them"""
+        shared = await self._read_shared_models(cache_key)
+        if shared is not None:
+            return shared
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # URL encode the make name
-                encoded_make = make_name.replace(" ", "%20")
-                response = await client.get(
-                    f"{self.BASE_URL}/vehicles/GetModelsForMake/{encoded_make}?format=json"
-                )
-                response.raise_for_status()
+            # URL encode the make name as a single path segment
+            response = await _client.get(
+                f"/vehicles/GetModelsForMake/{quote(make_name, safe='')}",
+                params={"format": "json"},
+            )
+            response.raise_for_status()
+            
+            data = response.json()
+            if data.get("Count", 0) > 0:
+                models = data.get("Results", [])
+                # Cache the results
+                self._cache_models(cache_key, models, self.CACHE_DURATION_SECONDS)
+                await self._write_shared_models(cache_key, models)
                 
-                data = response.json()
-                if data.get("Count", 0) > 0:
-                    models = data.get("Results", [])
-                    # Cache the results
-                    self._models_cache[cache_key] = models
-                    self._models_cache_time[cache_key] = datetime.now()
-                    
-                    logger.info(f"Successfully fetched {len(models)} models for make '{make_name}' from NHTSA")
-                    return models
-                else:
-                    logger.warning(f"No models returned from NHTSA API for make '{make_name}'")
-                    return []
+                logger.info(f"Successfully fetched {len(models)} models for make '{make_name}' from NHTSA")
+                return models
+            else:
+                logger.warning(f"No models returned from NHTSA API for make '{make_name}'")
+                return []
                     
         except httpx.TimeoutException:
             logger.error(f"Timeout while fetching models for make '{make_name}' from NHTSA API")
@@ -82,87 +325,12 @@ class NHTSAService:
             logger.error(f"Unexpected error while fetching models for make '{make_name}' from NHTSA API: {e}")
             return self._get_fallback_models(make_name)
     
-    def _get_curated_makes(self) -> List[Dict[str, str]]:
-        """Return curated list of 37 most common vehicle makes ordered alphabetically"""
-        makes = [
-            {"Make_ID": 22, "Make_Name": "Acura"},
-            {"Make_ID": 30, "Make_Name": "Alfa Romeo"},
-            {"Make_ID": 18, "Make_Name": "Audi"},
-            {"Make_ID": 32, "Make_Name": "Bentley"},
-            {"Make_ID": 13, "Make_Name": "BMW"},
-            {"Make_ID": 21, "Make_Name": "Buick"},
-            {"Make_ID": 19, "Make_Name": "Cadillac"},
-            {"Make_ID": 3, "Make_Name": "Chevrolet"},
-            {"Make_ID": 20, "Make_Name": "Chrysler"},
-            {"Make_ID": 17, "Make_Name": "Dodge"},
-            {"Make_ID": 34, "Make_Name": "Fiat"},
-            {"Make_ID": 2, "Make_Name": "Ford"},
-            {"Make_ID": 11, "Make_Name": "GMC"},
-            {"Make_ID": 27, "Make_Name": "Genesis"},
-            {"Make_ID": 4, "Make_Name": "Honda"},
-            {"Make_ID": 5, "Make_Name": "Hyundai"},
-            {"Make_ID": 28, "Make_Name": "INFINITI"},
-            {"Make_ID": 7, "Make_Name": "Jeep"},
-            {"Make_ID": 6, "Make_Name": "Kia"},
-            {"Make_ID": 33, "Make_Name": "Lamborghini"},
-            {"Make_ID": 16, "Make_Name": "Lexus"},
-            {"Make_ID": 25, "Make_Name": "Lincoln"},
-            {"Make_ID": 29, "Make_Name": "MINI"},
-            {"Make_ID": 35, "Make_Name": "McLaren"},
-            {"Make_ID": 31, "Make_Name": "Maserati"},
-            {"Make_ID": 15, "Make_Name": "Mazda"},
-            {"Make_ID": 12, "Make_Name": "Mercedes-Benz"},
-            {"Make_ID": 24, "Make_Name": "Mitsubishi"},
-            {"Make_ID": 8, "Make_Name": "Nissan"},
-            {"Make_ID": 26, "Make_Name": "Porsche"},
-            {"Make_ID": 10, "Make_Name": "Ram"},
-            {"Make_ID": 36, "Make_Name": "Rolls-Royce"},
-            {"Make_ID": 9, "Make_Name": "Subaru"},
-            {"Make_ID": 37, "Make_Name": "Tesla"},
-            {"Make_ID": 1, "Make_Name": "Toyota"},
-            {"Make_ID": 14, "Make_Name": "Volkswagen"},
-            {"Make_ID": 23, "Make_Name": "Volvo"},
-        ]
-        return makes
-    
-    def _get_fallback_makes(self) -> List[Dict[str, str]]:
-        """Return fallback list - now just returns the curated list"""
-        return self._get_curated_makes()
-    
     def _get_fallback_models(self, make_name: str) -> List[Dict[str, str]]:
-        """Return a fallback list of common models for popular makes if API fails"""
-        fallback_models = {
-            "Honda": [
-                {"Model_ID": 1, "Model_Name": "Accord", "Make_ID": 4, "Make_Name": "Honda"},
-                {"Model_ID": 2, "Model_Name": "Civic", "Make_ID": 4, "Make_Name": "Honda"},
-                {"Model_ID": 3, "Model_Name": "CR-V", "Make_ID": 4, "Make_Name": "Honda"},
-                {"Model_ID": 4, "Model_Name": "Pilot", "Make_ID": 4, "Make_Name": "Honda"},
-                {"Model_ID": 5, "Model_Name": "Odyssey", "Make_ID": 4, "Make_Name": "Honda"},
-            ],
-            "Toyota": [
-                {"Model_ID": 1, "Model_Name": "Camry", "Make_ID": 1, "Make_Name": "Toyota"},
-                {"Model_ID": 2, "Model_Name": "Corolla", "Make_ID": 1, "Make_Name": "Toyota"},
-                {"Model_ID": 3, "Model_Name": "RAV4", "Make_ID": 1, "Make_Name": "Toyota"},
-                {"Model_ID": 4, "Model_Name": "Highlander", "Make_ID": 1, "Make_Name": "Toyota"},
-                {"Model_ID": 5, "Model_Name": "Prius", "Make_ID": 1, "Make_Name": "Toyota"},
-            ],
-            "Ford": [
-                {"Model_ID": 1, "Model_Name": "F-150", "Make_ID": 2, "Make_Name": "Ford"},
-                {"Model_ID": 2, "Model_Name": "Escape", "Make_ID": 2, "Make_Name": "Ford"},
-                {"Model_ID": 3, "Model_Name": "Explorer", "Make_ID": 2, "Make_Name": "Ford"},
-                {"Model_ID": 4, "Model_Name": "Mustang", "Make_ID": 2, "Make_Name": "Ford"},
-                {"Model_ID": 5, "Model_Name": "Focus", "Make_ID": 2, "Make_Name": "Ford"},
-            ],
-            "Chevrolet": [
-                {"Model_ID": 1, "Model_Name": "Silverado", "Make_ID": 3, "Make_Name": "Chevrolet"},
-                {"Model_ID": 2, "Model_Name": "Equinox", "Make_ID": 3, "Make_Name": "Chevrolet"},
-                {"Model_ID": 3, "Model_Name": "Malibu", "Make_ID": 3, "Make_Name": "Chevrolet"},
-                {"Model_ID": 4, "Model_Name": "Tahoe", "Make_ID": 3, "Make_Name": "Chevrolet"},
-                {"Model_ID": 5, "Model_Name": "Cruze", "Make_ID": 3, "Make_Name": "Chevrolet"},
-            ],
-        }
-        
-        return fallback_models.get(make_name, [
+        """Return the last good models for the make, or a list of common models, if API fails"""
+        stale = self._stale_models.get(make_name.lower())
+        if stale is not None:
+            return stale
+        return _FALLBACK_MODELS.get(make_name, [
             {"Model_ID": 1, "Model_Name": "Unknown Model", "Make_ID": 1, "Make_Name": make_name}
         ])
 
@@ -1,7 +1,5 @@
-from google.cloud import tasks_v2
-from google.protobuf import timestamp_pb2, duration_pb2
 import datetime
-import json
+import orjson
 import os
 from typing import Dict, Any, Optional
 import logging
@@ -14,19 +12,33 @@ CLOUD_TASKS_QUEUE = os.environ.get("CLOUD_TASKS_QUEUE", "notification-tasks")
 CLOUD_TASKS_PROJECT = os.environ.get("GOOGLE_CLOUD_PROJECT")
 WORKER_SERVICE_URL = os.environ.get("WORKER_SERVICE_URL")
 
-# Initialize client
+# Initialize client lazily; importing tasks_v2 is slow and only needed
+# once a notification is actually enqueued
 tasks_client = None
+_queue_parent: Optional[str] = None
 
 def get_tasks_client():
     """Get or create Cloud Tasks client."""
     global tasks_client
     if tasks_client is None:
         try:
+            from google.cloud import tasks_v2
             tasks_client = tasks_v2.CloudTasksClient()
         except Exception as e:
             logger.error(f"Failed to initialize Cloud Tasks client: {str(e)}")
     return tasks_client
 
+def get_queue_parent(client) -> str:
+    """Get the notification queue path, computed once per process."""
+    global _queue_parent
+    if _queue_parent is None:
+        _queue_parent = client.queue_path(
+            CLOUD_TASKS_PROJECT, 
+            CLOUD_TASKS_LOCATION, 
+            CLOUD_TASKS_QUEUE
+        )
+    return _queue_parent
+
 def create_task_name(parent: str, queue: str, task_name: Optional[str] = None) -> str:
     """
     Create a fully qualified task name.
@@ -72,12 +84,10 @@ def enqueue_notification_task(
         logger.error("WORKER_SERVICE_URL not set, skipping notification")
         return ""
     
+    from google.cloud import tasks_v2
+    
     # Construct the queue path
-    parent = client.queue_path(
-        CLOUD_TASKS_PROJECT, 
-        CLOUD_TASKS_LOCATION, 
-        CLOUD_TASKS_QUEUE
-    )
+    parent = get_queue_parent(client)
     
     # Create task with HTTP target and authentication
     task = {
@@ -87,19 +97,19 @@ def enqueue_notification_task(
             'headers': {
                 'Content-Type': 'application/json',
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'booking_id': booking_id,
                 'notification_type': 'booking_created',
                 'data': payload
-            }).encode(),
+            }),
         }
     }
     
     # Add scheduling time if delayed
     if delay_seconds > 0:
-        d = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay_seconds)
-        timestamp = timestamp_pb2.Timestamp()
-        timestamp.FromDatetime(d)
+        from google.protobuf import timestamp_pb2
+        d = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay_seconds)
+        timestamp = timestamp_pb2.Timestamp(seconds=int(d.timestamp()))
         task['schedule_time'] = timestamp
     
     # Note: retry_config is configured on the queue, not individual tasks
@@ -3,8 +3,10 @@ Service area validation for mobile mechanic service.
 Validates customer addresses against serviceable ZIP codes.
 """
 import os
+import sys
 import logging
-from typing import List, Set
+from functools import lru_cache
+from typing import FrozenSet, List
 from .secret_manager import get_secret_or_env
 
 logger = logging.getLogger(__name__)
@@ -13,24 +15,37 @@ class ServiceAreaError(Exception):
     """Raised when a customer address is outside the service area."""
     pass
 
-def get_service_area_zips() -> Set[str]:
+def get_service_area_zips() -> FrozenSet[str]:
     """
     Get the list of serviceable ZIP codes from Secret Manager or environment variable.
     
+    The parsed set is cached for the process lifetime; call
+    invalidate_service_area_zips() to pick up a changed configuration.
+    
     Returns:
         Set of ZIP codes that are within the service area
     """
+    return _load_service_area_zips()
+
+def invalidate_service_area_zips() -> None:
+    """Clear the cached service area so the next lookup reloads it."""
+    _load_service_area_zips.cache_clear()
+
+@lru_cache(maxsize=1)
+def _load_service_area_zips() -> FrozenSet[str]:
+    """Load and parse the serviceable ZIP codes."""
     service_area_env = get_secret_or_env("SERVICE_AREA_ZIPS", "SERVICE_AREA_ZIPS", "")
     if not service_area_env:
         logger.warning("SERVICE_AREA_ZIPS not configured in Secret Manager or environment, allowing all ZIP codes")
-        return set()
+        return frozenset()
     
-    # Parse comma-separated ZIP codes and clean them
-    zip_codes = set()
-    for zip_code in service_area_env.split(","):
-        cleaned_zip = zip_code.strip()
-        if cleaned_zip:
-            zip_codes.add(cleaned_zip)
+    # Parse comma-separated ZIP codes and clean them; interning keeps one
+    # shared copy of each ZIP string for the process lifetime
+    zip_codes = frozenset(
+        sys.intern(zip_code)
+        for zip_code in (part.strip() for part in service_area_env.split(","))
+        if zip_code
+    )
     
     logger.info(f"Loaded {len(zip_codes)} serviceable ZIP codes from Secret Manager")
     return zip_codes
@@ -1,7 +1,17 @@
-from datetime import datetime, timedelta
-from typing import Dict
+import re
+from typing import Dict, List
 
-__all__ = ["build_slots"]
+__all__ = ["build_slots", "covered_slots"]
+
+_HHMM_RE = re.compile(r"([01]\d|2[0-3]):([0-5]\d)")
+
+
+def _to_minutes(value: str) -> int:
+    """Convert a strict HH:MM 24-hour string to minutes past midnight."""
+    match = _HHMM_RE.fullmatch(value)
+    if not match:
+        raise ValueError("start_time and end_time must be HH:MM 24-hour strings")
+    return int(match.group(1)) * 60 + int(match.group(2))
 
 
 def build_slots(start_time: str, end_time: str, granularity_min: int = 30) -> Dict[str, str]:
@@ -19,20 +29,29 @@ def build_slots(start_time: str, end_time: str, granularity_min: int = 30) -> Di
         ValueError: if input formats are invalid or end <= start.
     """
 
-    try:
-        start_dt = datetime.strptime(start_time, "%H:%M")
-        end_dt = datetime.strptime(end_time, "%H:%M")
-    except ValueError as err:
-        raise ValueError("start_time and end_time must be HH:MM 24-hour strings") from err
+    start = _to_minutes(start_time)
+    end = _to_minutes(end_time)
 
-    if end_dt <= start_dt:
+    if end <= start:
         raise ValueError("end_time must be after start_time")
 
-    slots: Dict[str, str] = {}
-    current = start_dt
-    while current < end_dt:
-        key = current.strftime("%H:%M")
-        slots[key] = "free"
-        current += timedelta(minutes=granularity_min)
+    return dict.fromkeys((f"{t // 60:02d}:{t % 60:02d}" for t in range(start, end, granularity_min)), "free")
+
+
+def covered_slots(start_time: str, duration_min: int, granularity_min: int = 30) -> List[str]:
+    """List the slots a booking occupies.
+
+    Args:
+        start_time: HH:MM string (24-hour) of the booking's first slot.
+        duration_min: booking length in minutes; at least the first slot is covered.
+        granularity_min: slot length in minutes (default 30).
+
+    Returns:
+        "HH:MM" labels of every slot from start_time until the booking ends.
+
+    Raises:
+        ValueError: if start_time is not a valid HH:MM string.
+    """
 
-    return slots 
\ No newline at end of file
+    start = _to_minutes(start_time)
+    return [f"{t // 60:02d}:{t % 60:02d}" for t in range(start, start + max(duration_min, 1), granularity_min)]
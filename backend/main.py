@@ -2,18 +2,17 @@ from fastapi import FastAPI, HTTPException
 from google.cloud import firestore
 
 app = FastAPI()
-db = firestore.Client()   # uses ADC on Cloud Run
+db = firestore.AsyncClient()   # uses ADC on Cloud Run
 
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"status": "ok"}
 
 @app.get("/availability")
-def list_availability():
-    # TODO: read from Firestore
-    return []
+async def list_availability():
+    return [doc.to_dict() async for doc in db.collection("availability").stream()]
 
 @app.post("/bookings")
-def create_booking(payload: dict):
+async def create_booking(payload: dict):
     # TODO: transaction logic
     raise HTTPException(status_code=501, detail="Not implemented yet")
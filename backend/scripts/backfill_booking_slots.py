@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Backfill booking_slots claims for active bookings.
+Bookings made before the booking_slots collection existed hold no claim, so
+create_booking would not see them as conflicts. Run once after deploying.
+"""
+
+import os
+import sys
+from google.cloud import firestore
+from google.api_core import exceptions as google_exceptions
+
+# Add the app directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import settings
+from app.services.booking_service import ACTIVE_BOOKING_STATUSES, slot_claim_refs
+
+# Initialize Firestore client
+db = firestore.Client(project=settings.project_id)
+print(f"Connected to Firestore project: {settings.project_id}")
+
+def backfill_booking_slots():
+    bookings = db.collection("bookings").where("status", "in", sorted(ACTIVE_BOOKING_STATUSES)).stream()
+    
+    created_count = 0
+    existing_count = 0
+    for booking in bookings:
+        for claim_ref in slot_claim_refs(db, booking.to_dict()):
+            try:
+                # create() never overwrites a claim, so re-running the script is safe
+                claim_ref.create({"booking_id": booking.id})
+                created_count += 1
+            except google_exceptions.AlreadyExists:
+                holder = claim_ref.get().to_dict().get("booking_id")
+                if holder != booking.id:
+                    print(f"- {claim_ref.id} is held by booking {holder}, not {booking.id}; resolve manually")
+                existing_count += 1
+    
+    print(f"\nCreated {created_count} booking_slots claims; {existing_count} already existed.")
+
+if __name__ == "__main__":
+    backfill_booking_slots()
@@ -18,6 +18,7 @@ from firebase_admin import credentials, auth
 # Add the app directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.config import settings
+from app.utils.slots import build_slots
 
 # Initialize Firebase Admin SDK (for user creation)
 try:
@@ -34,8 +35,8 @@ print(f"Connected to Firestore project: {settings.project_id}")
 def minutes_from_now(minutes):
     return datetime.now() + timedelta(minutes=minutes)
 
-# Batch operations for better performance
-batch = db.batch()
+# Bulk writer parallelizes the writes client-side
+bulk_writer = db.bulk_writer()
 
 # 1. Create Services
 service_data = [
@@ -80,7 +81,7 @@ service_data = [
 print("Creating services collection...")
 for service in service_data:
     service_ref = db.collection("services").document()
-    batch.set(service_ref, service)
+    bulk_writer.set(service_ref, service)
     print(f"Added service: {service['name']} (ID: {service_ref.id})")
 
 # 2. Create Mechanic (single mechanic for the business)
@@ -107,24 +108,20 @@ mechanic_data = [
 print("\nCreating mechanics collection...")
 for mechanic in mechanic_data:
     mechanic_ref = db.collection("mechanics").document()
-    batch.set(mechanic_ref, mechanic)
+    bulk_writer.set(mechanic_ref, mechanic)
     print(f"Added mechanic: {mechanic['name']} (ID: {mechanic_ref.id})")
 
 # 3. Create Availability for the next 7 days
 today = datetime.now().date()
 print("\nCreating availability for the next 7 days...")
 
+# Slots from 8:00 to 17:00 (30 min intervals), shared by every day
+slots = build_slots("08:00", "17:00", 30)
+
 for day_offset in range(7):
     day = today + timedelta(days=day_offset)
     day_iso = day.isoformat()
     
-    # Create slots from 8:00 to 17:00 (30 min intervals)
-    slots = {}
-    for hour in range(8, 17):
-        for minute in [0, 30]:
-            time_slot = f"{hour:02d}:{minute:02d}"
-            slots[time_slot] = "free"
-    
     availability_data = {
         "day": day_iso,
         "slots": slots,
@@ -134,7 +131,7 @@ for day_offset in range(7):
     }
     
     availability_ref = db.collection("availability").document(day_iso)
-    batch.set(availability_ref, availability_data)
+    bulk_writer.set(availability_ref, availability_data)
     print(f"Added availability for: {day_iso} with {len(slots)} slots")
 
 # 4. Create sample users
@@ -186,10 +183,10 @@ for user in user_data:
     
     # Create user document in Firestore
     user_ref = db.collection("users").document(user_id)
-    batch.set(user_ref, user)
+    bulk_writer.set(user_ref, user)
     print(f"Added user to Firestore: {user['name']} ({user['role']})")
 
 # Commit all changes
 print("\nCommitting all changes to Firestore...")
-batch.commit()
+bulk_writer.close()
 print("Sample data initialization complete!")
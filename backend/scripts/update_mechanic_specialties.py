@@ -17,51 +17,55 @@ from app.config import settings
 db = firestore.Client(project=settings.project_id)
 print(f"Connected to Firestore project: {settings.project_id}")
 
+# Firestore allows at most 500 writes per batch; stay safely below it
+BATCH_SIZE = 450
+
 def update_mechanic_specialties():
-    # Get all services
-    services = list(db.collection("services").stream())
-    service_ids = [service.id for service in services]
+    # Get all services, keyed by ID so specialty lookups don't rescan the list
+    name_by_id = {service.id: service.to_dict().get("name", "Unknown") for service in db.collection("services").stream()}
+    service_ids = list(name_by_id)
     
     if not service_ids:
         print("No services found in Firestore.")
         return
     
     print(f"Found {len(service_ids)} services:")
-    for service in services:
-        print(f"- {service.id}: {service.to_dict().get('name')}")
+    for service_id, service_name in name_by_id.items():
+        print(f"- {service_id}: {service_name}")
     
     # Get all mechanics
-    mechanics = list(db.collection("mechanics").stream())
+    mechanics_data = [(mechanic.id, mechanic.to_dict()) for mechanic in db.collection("mechanics").stream()]
     
-    if not mechanics:
+    if not mechanics_data:
         print("No mechanics found in Firestore.")
         return
     
-    print(f"\nFound {len(mechanics)} mechanics:")
-    for mechanic in mechanics:
-        print(f"- {mechanic.id}: {mechanic.to_dict().get('name')}")
+    print(f"\nFound {len(mechanics_data)} mechanics:")
+    for mechanic_id, mechanic in mechanics_data:
+        print(f"- {mechanic_id}: {mechanic.get('name')}")
     
     # Update each mechanic with random specialties
     batch = db.batch()
     updated_count = 0
     
-    for mechanic in mechanics:
+    for mechanic_id, mechanic in mechanics_data:
         # Assign 2-4 random specialties to each mechanic
         num_specialties = random.randint(2, min(4, len(service_ids)))
         specialties = random.sample(service_ids, num_specialties)
         
-        mechanic_ref = db.collection("mechanics").document(mechanic.id)
+        mechanic_ref = db.collection("mechanics").document(mechanic_id)
         batch.update(mechanic_ref, {"specialties": specialties})
         
-        mechanic_name = mechanic.to_dict().get("name")
-        print(f"\nUpdating {mechanic_name} with specialties:")
+        print(f"\nUpdating {mechanic.get('name')} with specialties:")
         for service_id in specialties:
-            service_name = next((s.to_dict().get("name") for s in services if s.id == service_id), "Unknown")
-            print(f"- {service_id}: {service_name}")
+            print(f"- {service_id}: {name_by_id.get(service_id, 'Unknown')}")
         
         updated_count += 1
+        if updated_count % BATCH_SIZE == 0:
+            batch.commit()
+            batch = db.batch()
     
-    # Commit the batch
+    # Commit the remaining updates
     batch.commit()
     print(f"\nSuccessfully updated {updated_count} mechanics with specialties.")
 
@@ -1,72 +1,260 @@
 import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
 import pytest
-import firebase_admin
-from firebase_admin import credentials, auth
 from google.cloud import firestore
+from fastapi.testclient import TestClient
+from mockfirestore import MockFirestore
 from datetime import datetime, timedelta
 import uuid
 from backend.app.models import SlotStatus, UserRole
 
-# Set environment variables for Firestore emulator
-os.environ["FIRESTORE_EMULATOR_HOST"] = "localhost:8080"
+# Set environment variables for the Auth emulator; Firestore's is exported by firestore_emulator
 os.environ["FIREBASE_AUTH_EMULATOR_HOST"] = "localhost:9099"
 
+# Don't call NHTSA or write its cache from the app's startup hook during tests
+os.environ["NHTSA_WARM_CACHE"] = "false"
+
+# One emulator per pytest-xdist worker (gw0 -> 8080, gw1 -> 8081, ...), each with its own project
+_XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+FIRESTORE_EMULATOR_HOST = f"localhost:{8080 + int(_XDIST_WORKER[2:]) if _XDIST_WORKER else 8080}"
+TEST_PROJECT = f"test-{_XDIST_WORKER}" if _XDIST_WORKER else "test-project"
+
+# Default free slot grid for sample availability (08:00-16:30, every 30 minutes)
+_DEFAULT_SLOTS = {f"{h:02d}:{m:02d}": SlotStatus.FREE.value for h in range(8, 17) for m in (0, 30)}
+
+def pytest_configure(config):
+    """Register custom markers."""
+    config.addinivalue_line("markers", "emulator: test needs a real Firestore emulator")
+
+def _wait_for_port(host, port, timeout=30.0):
+    """Block until a TCP port accepts connections or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Firestore emulator did not start on {host}:{port}")
+
 @pytest.fixture(scope="session")
-def firebase_app():
-    """Initialize Firebase app for testing."""
+def firestore_emulator():
+    """Start a Firestore emulator whose data dir lives on tmpfs, unless one is already running."""
+    # Point the app's own clients at this worker's project
+    os.environ["GOOGLE_CLOUD_PROJECT"] = TEST_PROJECT
+    
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        # An emulator was started externally (e.g. run_tests.sh); workers share it, namespaced by project
+        yield os.environ["FIRESTORE_EMULATOR_HOST"]
+        return
+    
+    # Keep emulator state in memory-backed storage to avoid fsync on every write
+    base_dir = "/dev/shm" if sys.platform.startswith("linux") and os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    data_dir = os.path.join(base_dir, f"fs-emu-{_XDIST_WORKER or 'main'}-{os.getpid()}")
+    os.makedirs(data_dir, exist_ok=True)
+    
+    process = subprocess.Popen(
+        [
+            "gcloud", "emulators", "firestore", "start",
+            f"--host-port={FIRESTORE_EMULATOR_HOST}",
+            "--database-mode=firestore-native",
+            f"--data-dir={data_dir}",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
     try:
-        # Try to initialize, if it fails it may already be initialized
-        app = firebase_admin.initialize_app(name="test")
-        return app
-    except ValueError:
-        # Return the default app if already initialized
-        return firebase_admin.get_app(name="test")
+        host, port = FIRESTORE_EMULATOR_HOST.split(":")
+        _wait_for_port(host, int(port))
+        os.environ["FIRESTORE_EMULATOR_HOST"] = FIRESTORE_EMULATOR_HOST
+        yield FIRESTORE_EMULATOR_HOST
+    finally:
+        os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
 
 @pytest.fixture(scope="session")
-def firestore_client():
+def firestore_client(firestore_emulator):
     """Get a Firestore client connected to the emulator."""
-    client = firestore.Client(project="test-project")
+    client = firestore.Client(project=TEST_PROJECT)
     return client
 
-@pytest.fixture(scope="function")
-def clean_firestore(firestore_client):
-    """Clean up Firestore before and after each test."""
-    # Delete all collections before the test
-    cleanup_firestore(firestore_client)
+@pytest.fixture(scope="session")
+def api_client(firestore_emulator):
+    """Share one emulator-backed TestClient so app startup and shutdown run once per session."""
+    from backend.app.main import app
     
-    yield firestore_client
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def app_client():
+    """TestClient for tests that don't reach Firestore or serve it from fake_app_db."""
+    from backend.app.main import app
     
-    # Delete all collections after the test
-    cleanup_firestore(firestore_client)
+    with TestClient(app) as client:
+        yield client
 
-def cleanup_firestore(client):
-    """Helper function to delete all collections."""
-    collections = client.collections()
-    for collection in collections:
-        delete_collection(client, collection.id)
+# The notification worker is a flat set of modules run from its own directory
+WORKER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "worker")
 
-def delete_collection(client, collection_id, batch_size=100):
-    """Delete a collection using batches."""
-    collection_ref = client.collection(collection_id)
-    docs = collection_ref.limit(batch_size).stream()
-    deleted = 0
+@pytest.fixture
+def worker(monkeypatch):
+    """Import the notification worker's main module, as Cloud Run runs it from the worker directory."""
+    monkeypatch.syspath_prepend(WORKER_DIR)
+    monkeypatch.chdir(WORKER_DIR)
+    import main
+    
+    return main
+
+class _MockWriteBatch:
+    """Write batch for MockFirestore, which has no batch(); writes are applied on commit."""
+    
+    def __init__(self):
+        self._writes = []
+    
+    def set(self, ref, data, merge=False):
+        self._writes.append(lambda: ref.set(data, merge=merge))
+    
+    def update(self, ref, data):
+        self._writes.append(lambda: ref.update(data))
+    
+    def delete(self, ref):
+        self._writes.append(ref.delete)
+    
+    def commit(self):
+        for write in self._writes:
+            write()
+        self._writes.clear()
+
+class _BatchingMockFirestore(MockFirestore):
+    """MockFirestore with the batch() the seeding code relies on."""
+    
+    def batch(self):
+        return _MockWriteBatch()
+
+@pytest.fixture
+def fake_db():
+    """In-memory Firestore for tests that only check document shape."""
+    return _BatchingMockFirestore()
+
+def override_db(monkeypatch, db):
+    """Point every loaded app module that uses get_client() at the given client."""
+    import backend.app.main  # noqa: F401  ensure routers and services are imported
+    
+    monkeypatch.setattr("backend.app.firestore.get_client", lambda: db)
+    for name, module in list(sys.modules.items()):
+        if name.startswith("backend.app.") and hasattr(module, "get_client"):
+            monkeypatch.setattr(module, "get_client", lambda: db)
+
+@pytest.fixture
+def fake_app_db(fake_db, monkeypatch):
+    """Serve the app from the in-memory Firestore for the duration of a test."""
+    override_db(monkeypatch, fake_db)
+    return fake_db
+
+@pytest.fixture
+def async_firestore_client(firestore_emulator):
+    """Get an async Firestore client connected to the emulator."""
+    return firestore.AsyncClient(project=TEST_PROJECT)
+
+@pytest.fixture(scope="session")
+def _firestore_dirty():
+    """Session-wide flag recording whether a test has written to Firestore."""
+    return {"dirty": False}
 
-    for doc in docs:
-        doc.reference.delete()
-        deleted += 1
+@pytest.fixture(scope="session")
+def _firestore_session(firestore_client):
+    """Wipe Firestore once at the start of the session."""
+    cleanup_firestore(firestore_client)
+    return firestore_client
 
-    if deleted >= batch_size:
-        # If we've reached the batch size, there might be more documents
-        return delete_collection(client, collection_id, batch_size)
+@pytest.fixture(scope="module")
+def module_firestore(_firestore_session):
+    """Yield the Firestore client for module-scoped seeded state and wipe it when the module finishes."""
+    yield _firestore_session
+    cleanup_firestore(_firestore_session)
+
+@pytest.fixture
+def mark_dirty(_firestore_dirty):
+    """Flag Firestore for cleanup once the requesting test finishes."""
+    _firestore_dirty["dirty"] = True
 
 @pytest.fixture(scope="function")
-def sample_data(clean_firestore):
-    """Populate Firestore with sample data for testing."""
-    db = clean_firestore
+def clean_firestore(_firestore_session, _firestore_dirty):
+    """Yield the Firestore client and wipe it afterwards only if the test wrote data."""
+    yield _firestore_session
+    
+    # Delete all collections only when a test marked the database dirty
+    if _firestore_dirty["dirty"]:
+        cleanup_firestore(_firestore_session)
+        _firestore_dirty["dirty"] = False
+
+def cleanup_firestore(client, batch_size=500):
+    """Helper function to delete all collections, batching deletes across collections."""
+    delete_documents(
+        client,
+        (doc.reference for collection in client.collections() for doc in collection.stream()),
+        batch_size,
+    )
+
+def delete_documents(client, doc_refs, batch_size=500):
+    """Delete documents (including subcollections) using batched writes."""
+    batch = client.batch()
+    pending = 0
+    for doc_ref in doc_refs:
+        _delete_subcollections(client, doc_ref.path, doc_ref)
+        batch.delete(doc_ref)
+        pending += 1
+        if pending == batch_size:
+            batch.commit()
+            batch = client.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+def delete_collection(client, collection_id, batch_size=500):
+    """Delete a collection (including subcollections) using batched writes."""
+    collection_ref = client.collection(collection_id)
+    while True:
+        docs = list(collection_ref.limit(batch_size).stream())
+        if not docs:
+            return
+        batch = client.batch()
+        for doc in docs:
+            _delete_subcollections(client, f"{collection_id}/{doc.id}", doc.reference)
+            batch.delete(doc.reference)
+        batch.commit()
+
+def _delete_subcollections(client, doc_path, doc_ref):
+    """Delete every subcollection of a document so no orphaned children remain."""
+    for sub in doc_ref.collections():
+        delete_collection(client, f"{doc_path}/{sub.id}")
+
+def _seed_sample_data(db, prefix="test", day=None):
+    """Write the sample service, mechanic, booking, availability and user documents in one batch.
+    
+    Document IDs start with prefix, and the mechanic only works on day (today by default),
+    so differently prefixed seeds on different days don't touch each other's documents.
+    """
+    from backend.app.services.booking_service import booking_slot_key
+    
+    day = day or datetime.now().date()
+    today = day.isoformat()
+    batch = db.batch()
     
     # Create a service
-    service_ref = db.collection("services").document("test-service")
-    service_ref.set({
+    service_ref = db.collection("services").document(f"{prefix}-service")
+    batch.set(service_ref, {
         "name": "Test Service",
         "minutes": 30,
         "description": "Service for testing",
@@ -76,50 +264,86 @@ def sample_data(clean_firestore):
         "updated_at": firestore.SERVER_TIMESTAMP
     })
     
-    # Create availability for today
-    today = datetime.now().date().isoformat()
-    slots = {}
-    for hour in range(8, 17):
-        for minute in [0, 30]:
-            time_slot = f"{hour:02d}:{minute:02d}"
-            slots[time_slot] = SlotStatus.FREE.value
+    # Create a mechanic who works only on the seeded day
+    mechanic_ref = db.collection("mechanics").document(f"{prefix}-mechanic")
+    batch.set(mechanic_ref, {
+        "name": "Test Mechanic",
+        "email": f"{prefix}-mechanic@example.com",
+        "phone": "555-0100",
+        "schedule": {day.strftime("%A").lower(): {"start": "08:00", "end": "17:00"}},
+        "active": True,
+    })
+    
+    # Book one slot with the mechanic and mirror it in the day's availability
+    booked_slot = "13:00"
+    slot_start = datetime.combine(day, datetime.strptime(booked_slot, "%H:%M").time())
+    booking_ref = db.collection("bookings").document(f"{prefix}-booking")
+    batch.set(booking_ref, {
+        "service_id": service_ref.id,
+        "mechanic_id": mechanic_ref.id,
+        "slot_start": slot_start,
+        "slot_end": slot_start + timedelta(minutes=30),
+        "status": "confirmed",
+        "customer_name": "Booked Customer",
+        "customer_email": "booked@example.com",
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "updated_at": firestore.SERVER_TIMESTAMP
+    })
+    claim_ref = db.collection("booking_slots").document(booking_slot_key(today, booked_slot, mechanic_ref.id))
+    batch.set(claim_ref, {"booking_id": booking_ref.id})
     
+    slots = {**_DEFAULT_SLOTS, booked_slot: SlotStatus.BOOKED.value}
     availability_ref = db.collection("availability").document(today)
-    availability_ref.set({
+    batch.set(availability_ref, {
         "day": today,
         "slots": slots,
-        "mechanics": {},
+        "mechanics": {mechanic_ref.id: True},
         "created_at": firestore.SERVER_TIMESTAMP,
         "updated_at": firestore.SERVER_TIMESTAMP
     })
     
-    # Mark one slot as already booked
-    booked_slot = "13:00"
-    availability_ref.update({
-        f"slots.{booked_slot}": SlotStatus.BOOKED.value
-    })
-    
     # Create a test user in Firestore
-    user_id = f"test-user-{uuid.uuid4()}"
+    user_id = f"{prefix}-user-{uuid.uuid4()}"
     user_ref = db.collection("users").document(user_id)
-    user_ref.set({
+    batch.set(user_ref, {
         "email": "test@example.com",
         "name": "Test User",
         "role": UserRole.CUSTOMER.value,
         "created_at": firestore.SERVER_TIMESTAMP,
         "updated_at": firestore.SERVER_TIMESTAMP
     })
+    batch.commit()
     
     # Return data for tests to use
     return {
         "service_id": service_ref.id,
+        "mechanic_id": mechanic_ref.id,
         "today": today,
         "available_slot": "09:00",
         "booked_slot": booked_slot,
         "user_id": user_id,
-        "user_email": "test@example.com"
+        "user_email": "test@example.com",
+        "doc_refs": [service_ref, mechanic_ref, booking_ref, claim_ref, availability_ref, user_ref],
     }
 
+@pytest.fixture(scope="function")
+def sample_data(clean_firestore, mark_dirty):
+    """Populate Firestore with sample data for tests that write to it."""
+    return _seed_sample_data(clean_firestore)
+
+@pytest.fixture(scope="module")
+def shared_sample_data(_firestore_session):
+    """Populate Firestore once per module for read-only tests and delete the seeded documents afterwards.
+    
+    Seeds tomorrow under its own document IDs, so sample_data seeded in the same
+    module never overwrites these documents or has them deleted underneath it.
+    """
+    db = _firestore_session
+    data = _seed_sample_data(db, prefix="shared", day=datetime.now().date() + timedelta(days=1))
+    yield data
+    
+    delete_documents(db, data["doc_refs"])
+
 @pytest.fixture
 def mock_auth_user():
     """Mock the get_current_user dependency."""
@@ -1,34 +1,44 @@
+import asyncio
+import functools
 import pytest
-from fastapi.testclient import TestClient
 from datetime import datetime, timedelta, date
 from unittest.mock import patch, MagicMock
 import json
 from google.cloud import firestore
 
-from backend.app.main import app
 from backend.app.models import MechanicSchedule, DaySchedule
 
 
-client = TestClient(app)
-
-
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_scheduler_auth():
     """Mock Google Cloud Scheduler authentication."""
     return {"User-Agent": "Google-Cloud-Scheduler", "X-CloudScheduler": "true"}
 
 
 @pytest.fixture
-def setup_mechanic_schedules(clean_firestore):
+def seed_db(request):
+    """Firestore for the seed tests: the emulator for emulator-marked tests, otherwise an in-memory fake."""
+    if request.node.get_closest_marker("emulator"):
+        request.getfixturevalue("mark_dirty")
+        return request.getfixturevalue("clean_firestore")
+    return request.getfixturevalue("fake_app_db")
+
+
+@pytest.fixture
+def setup_mechanic_schedules(seed_db):
     """Set up active mechanics with different schedules."""
-    db = clean_firestore
-    
-    # Create test mechanics
+    return _write_mechanic_schedules(seed_db)
+
+
+def _write_mechanic_schedules(db):
+    """Write two active mechanics and one inactive one, returning the active IDs."""
+    # Create test mechanics in a single batch
+    batch = db.batch()
     mechanics = []
     
     # Mechanic with full schedule
     mechanic1_ref = db.collection("mechanics").document("mechanic1")
-    mechanic1_ref.set({
+    batch.set(mechanic1_ref, {
         "name": "Full Schedule Mechanic",
         "email": "full@example.com",
         "specialties": ["oil-change", "tire-rotation"],
@@ -49,7 +59,7 @@ def setup_mechanic_schedules(clean_firestore):
     
     # Mechanic with partial schedule (only works Tue/Thu)
     mechanic2_ref = db.collection("mechanics").document("mechanic2")
-    mechanic2_ref.set({
+    batch.set(mechanic2_ref, {
         "name": "Part-Time Mechanic",
         "email": "part@example.com",
         "specialties": ["brake-service"],
@@ -70,7 +80,7 @@ def setup_mechanic_schedules(clean_firestore):
     
     # Create one inactive mechanic (should be ignored)
     mechanic3_ref = db.collection("mechanics").document("mechanic3")
-    mechanic3_ref.set({
+    batch.set(mechanic3_ref, {
         "name": "Inactive Mechanic",
         "email": "inactive@example.com",
         "specialties": ["oil-change"],
@@ -87,11 +97,13 @@ def setup_mechanic_schedules(clean_firestore):
         "created_at": firestore.SERVER_TIMESTAMP,
         "updated_at": firestore.SERVER_TIMESTAMP
     })
+    batch.commit()
     
     # Return the IDs and details for assertions
     return mechanics
 
 
+@functools.lru_cache(maxsize=1)
 def get_next_monday():
     """Helper to get the next Monday's date."""
     today = datetime.utcnow().date()
@@ -101,12 +113,36 @@ def get_next_monday():
     return today + timedelta(days=days_ahead)
 
 
-def test_seed_availability_dry_run(setup_mechanic_schedules, mock_scheduler_auth, clean_firestore):
+@pytest.fixture(scope="session")
+def week_dates():
+    """The seeded week as (date, ISO string) pairs, Monday first."""
+    next_monday = get_next_monday()
+    days = [next_monday + timedelta(days=i) for i in range(7)]
+    return [(day, day.isoformat()) for day in days]
+
+
+@pytest.fixture(scope="module")
+def seeded_week(module_firestore, api_client, mock_scheduler_auth):
+    """Seed mechanics and run the first non-dry-run seed once for the module's emulator tests."""
+    active_mechanic_ids = _write_mechanic_schedules(module_firestore)
+    next_monday = get_next_monday()
+    
+    response = api_client.post(
+        "/availability/seed",
+        json={"week_start": next_monday.isoformat(), "dry_run": False},
+        headers=mock_scheduler_auth
+    )
+    assert response.status_code == 202
+    
+    return next_monday, active_mechanic_ids, response.json()
+
+
+def test_seed_availability_dry_run(setup_mechanic_schedules, mock_scheduler_auth, seed_db, app_client, week_dates):
     """Test the availability seed endpoint in dry run mode."""
     next_monday = get_next_monday()
     
     # Call the endpoint with Cloud Scheduler auth headers and dry_run=true
-    response = client.post(
+    response = app_client.post(
         "/availability/seed",
         json={"week_start": next_monday.isoformat(), "dry_run": True},
         headers=mock_scheduler_auth
@@ -121,37 +157,26 @@ def test_seed_availability_dry_run(setup_mechanic_schedules, mock_scheduler_auth
     assert data["dry_run"] is True
     
     # No documents should have been created in Firestore
-    db = clean_firestore
-    for i in range(7):
-        day = next_monday + timedelta(days=i)
-        doc = db.collection("availability").document(day.isoformat()).get()
+    db = seed_db
+    for _, day_iso in week_dates:
+        doc = db.collection("availability").document(day_iso).get()
         assert not doc.exists
 
 
-def test_seed_availability_creates_docs(setup_mechanic_schedules, mock_scheduler_auth, clean_firestore):
+@pytest.mark.emulator
+async def test_seed_availability_creates_docs(seeded_week, async_firestore_client, week_dates):
     """Test the availability seed endpoint creates/updates docs."""
-    active_mechanic_ids = setup_mechanic_schedules
-    next_monday = get_next_monday()
-    
-    # Call the endpoint with Cloud Scheduler auth headers
-    response = client.post(
-        "/availability/seed",
-        json={"week_start": next_monday.isoformat(), "dry_run": False},
-        headers=mock_scheduler_auth
-    )
-    
-    assert response.status_code == 202
-    data = response.json()
+    _, active_mechanic_ids, data = seeded_week
     
     # Verify created and updated counts
     assert data["created"] > 0
     
-    # Verify documents were created in Firestore for each weekday
-    db = clean_firestore
-    weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+    # Fetch the whole week's documents concurrently
+    refs = [async_firestore_client.collection("availability").document(day_iso) for _, day_iso in week_dates]
+    docs = await asyncio.gather(*[ref.get() for ref in refs])
     
     # Verify Monday (both mechanics should work)
-    monday_doc = db.collection("availability").document(next_monday.isoformat()).get()
+    monday_doc = docs[0]
     assert monday_doc.exists
     monday_data = monday_doc.to_dict()
     
@@ -161,8 +186,7 @@ def test_seed_availability_creates_docs(setup_mechanic_schedules, mock_scheduler
     assert "mechanic2" not in monday_data["mechanics"]
     
     # Check slots for a specific day (Tuesday - both mechanics work)
-    tuesday = next_monday + timedelta(days=1)
-    tuesday_doc = db.collection("availability").document(tuesday.isoformat()).get()
+    tuesday_doc = docs[1]
     assert tuesday_doc.exists
     tuesday_data = tuesday_doc.to_dict()
     
@@ -177,30 +201,20 @@ def test_seed_availability_creates_docs(setup_mechanic_schedules, mock_scheduler
     assert tuesday_data["slots"]["14:30"] == "free"
     
     # Weekend days should have no mechanic availability
-    sunday = next_monday + timedelta(days=6)
-    sunday_doc = db.collection("availability").document(sunday.isoformat()).get()
+    sunday_doc = docs[6]
     if sunday_doc.exists:
         sunday_data = sunday_doc.to_dict()
         assert len(sunday_data.get("slots", {})) == 0
 
 
-def test_seed_availability_idempotent(setup_mechanic_schedules, mock_scheduler_auth, clean_firestore):
+@pytest.mark.emulator
+def test_seed_availability_idempotent(seeded_week, mock_scheduler_auth, api_client):
     """Test that seeding is idempotent (can be run multiple times safely)."""
-    next_monday = get_next_monday()
-    
-    # Call the endpoint first time
-    response1 = client.post(
-        "/availability/seed",
-        json={"week_start": next_monday.isoformat(), "dry_run": False},
-        headers=mock_scheduler_auth
-    )
-    
-    assert response1.status_code == 202
-    data1 = response1.json()
+    next_monday, _, data1 = seeded_week
     assert data1["created"] > 0
     
     # Call the endpoint second time with same data
-    response2 = client.post(
+    response2 = api_client.post(
         "/availability/seed",
         json={"week_start": next_monday.isoformat(), "dry_run": False},
         headers=mock_scheduler_auth
@@ -214,9 +228,9 @@ def test_seed_availability_idempotent(setup_mechanic_schedules, mock_scheduler_a
     assert data2["updated"] > 0
 
 
-def test_seed_availability_respects_booked_slots(setup_mechanic_schedules, mock_scheduler_auth, clean_firestore):
+def test_seed_availability_respects_booked_slots(setup_mechanic_schedules, mock_scheduler_auth, seed_db, app_client):
     """Test that seeding doesn't overwrite booked slots."""
-    db = clean_firestore
+    db = seed_db
     next_monday = get_next_monday()
     
     # First create a document with a booked slot
@@ -234,7 +248,7 @@ def test_seed_availability_respects_booked_slots(setup_mechanic_schedules, mock_
     })
     
     # Now seed availability
-    response = client.post(
+    response = app_client.post(
         "/availability/seed",
         json={"week_start": next_monday.isoformat(), "dry_run": False},
         headers=mock_scheduler_auth
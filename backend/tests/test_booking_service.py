@@ -0,0 +1,76 @@
+import pytest
+from datetime import datetime
+
+from backend.app.models import BookingCreate, Slot
+from backend.app.services.booking_service import BookingService, SlotUnavailableError, booked_slot_times
+from backend.app.utils.slots import covered_slots
+
+
+# 09:00 and 09:30 are free for mechanic1, 10:00 is already booked
+_DAY_SLOTS = [
+    Slot(start="2030-01-07T09:00:00", end="2030-01-07T09:00:00", is_free=True, mechanic_id="mechanic1"),
+    Slot(start="2030-01-07T09:30:00", end="2030-01-07T09:30:00", is_free=True, mechanic_id="mechanic1"),
+    Slot(start="2030-01-07T10:00:00", end="2030-01-07T10:00:00", is_free=False, mechanic_id=None),
+]
+
+
+@pytest.fixture
+def booking_service(monkeypatch):
+    """BookingService whose availability generation returns _DAY_SLOTS."""
+    async def fake_generate(db, day, service_id=None):
+        return _DAY_SLOTS
+    
+    monkeypatch.setattr("backend.app.routers.availability._generate_availability_for_day", fake_generate)
+    # Skip __init__; availability checks only need the (unused) sync client
+    service = object.__new__(BookingService)
+    service.db = None
+    return service
+
+
+def _payload(hour, minute):
+    return BookingCreate(
+        service_id="test-service",
+        slot_start=datetime(2030, 1, 7, hour, minute),
+        customer_name="Test User",
+        customer_email="test@example.com",
+        customer_address="1 Main St",
+        customer_city="Springfield",
+        customer_state="IL",
+        customer_zip="12345",
+    )
+
+
+async def test_validate_availability_returns_day_slots(booking_service):
+    slots_by_time = await booking_service.validate_availability(_payload(9, 0), "09:00")
+    assert slots_by_time["09:00"].mechanic_id == "mechanic1"
+    assert set(slots_by_time) == {"09:00", "09:30", "10:00"}
+
+
+async def test_validate_availability_rejects_booked_start_slot(booking_service):
+    with pytest.raises(SlotUnavailableError):
+        await booking_service.validate_availability(_payload(10, 0), "10:00")
+
+
+@pytest.mark.parametrize("time, duration", [("09:00", 30), ("09:00", 60), ("09:30", 30)])
+async def test_check_slots_free_accepts_free_window(booking_service, time, duration):
+    hour, minute = map(int, time.split(":"))
+    slots_by_time = await booking_service.validate_availability(_payload(hour, minute), time)
+    booking_service.check_slots_free(slots_by_time, covered_slots(time, duration))
+
+
+@pytest.mark.parametrize("time, duration", [("09:30", 60), ("09:00", 90), ("09:30", 90)])
+async def test_check_slots_free_rejects_window_running_into_booked_slot(booking_service, time, duration):
+    hour, minute = map(int, time.split(":"))
+    slots_by_time = await booking_service.validate_availability(_payload(hour, minute), time)
+    with pytest.raises(SlotUnavailableError):
+        booking_service.check_slots_free(slots_by_time, covered_slots(time, duration))
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (datetime(2030, 1, 7, 9, 0), None, ["09:00"]),
+    (datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 9, 30), ["09:00"]),
+    (datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 10, 0), ["09:00", "09:30"]),
+    (datetime(2030, 1, 7, 9, 30), datetime(2030, 1, 7, 10, 45), ["09:30", "10:00", "10:30"]),
+])
+def test_booked_slot_times_covers_whole_booking(start, end, expected):
+    assert booked_slot_times(start, end) == expected
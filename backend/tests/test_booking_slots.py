@@ -0,0 +1,203 @@
+import pytest
+from datetime import date, timedelta
+from google.cloud import firestore
+
+from backend.app.auth import User, get_current_user, get_mechanic_user
+from backend.app.models import UserRole
+from backend.app.services.booking_service import booking_slot_key
+
+pytestmark = pytest.mark.emulator
+
+CUSTOMER_EMAIL = "slots@example.com"
+
+
+def _next_monday() -> date:
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+@pytest.fixture
+def booking_day(clean_firestore, mark_dirty):
+    """Seed 30 and 60 minute services and one mechanic working next Monday morning."""
+    db = clean_firestore
+    batch = db.batch()
+    batch.set(db.collection("services").document("test-service"), {
+        "name": "Test Service",
+        "minutes": 30,
+        "price": 50.0,
+        "active": True,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    })
+    batch.set(db.collection("services").document("long-service"), {
+        "name": "Long Service",
+        "minutes": 60,
+        "price": 90.0,
+        "active": True,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    })
+    batch.set(db.collection("mechanics").document("mechanic1"), {
+        "name": "Mechanic One",
+        "email": "mechanic1@example.com",
+        "phone": "555-0100",
+        "schedule": {"monday": {"start": "09:00", "end": "12:00"}},
+        "active": True,
+    })
+    batch.commit()
+    return _next_monday()
+
+
+@pytest.fixture
+def admin_client(api_client):
+    """api_client authenticated as an admin who is also the booking's customer."""
+    user = User(
+        uid="slots-admin",
+        email=CUSTOMER_EMAIL,
+        name="Slots Admin",
+        role=UserRole.ADMIN.value,
+        is_admin=True,
+        is_mechanic=True,
+    )
+    app = api_client.app
+    app.dependency_overrides[get_current_user] = lambda: user
+    app.dependency_overrides[get_mechanic_user] = lambda: user
+    yield api_client
+    app.dependency_overrides.pop(get_current_user, None)
+    app.dependency_overrides.pop(get_mechanic_user, None)
+
+
+def _book(client, day: date, time: str = "09:00", service_id: str = "test-service"):
+    return client.post("/bookings", json={
+        "service_id": service_id,
+        "slot_start": f"{day.isoformat()}T{time}:00",
+        "customer_name": "Slots Customer",
+        "customer_email": CUSTOMER_EMAIL,
+        "customer_address": "1 Main St",
+        "customer_city": "Springfield",
+        "customer_state": "IL",
+        "customer_zip": "12345",
+    })
+
+
+def _claim(db, day: date, time: str = "09:00", mechanic_id: str = "mechanic1"):
+    return db.collection("booking_slots").document(booking_slot_key(day.isoformat(), time, mechanic_id)).get()
+
+
+def test_booking_claims_slot_and_rejects_double_booking(admin_client, booking_day, clean_firestore):
+    response = _book(admin_client, booking_day)
+    assert response.status_code == 201
+    booking_id = response.json()["id"]
+    
+    claim = _claim(clean_firestore, booking_day)
+    assert claim.exists
+    assert claim.to_dict()["booking_id"] == booking_id
+    
+    assert _book(admin_client, booking_day).status_code == 409
+
+
+def test_existing_claim_blocks_booking(admin_client, booking_day, clean_firestore):
+    # A claim left by another booking wins even if the day cache still shows the slot free
+    clean_firestore.collection("booking_slots").document(
+        booking_slot_key(booking_day.isoformat(), "09:00", "mechanic1")
+    ).set({"booking_id": "other-booking"})
+    
+    assert _book(admin_client, booking_day).status_code == 409
+
+
+def test_other_mechanic_slot_claim_does_not_conflict(admin_client, booking_day, clean_firestore):
+    clean_firestore.collection("booking_slots").document(
+        booking_slot_key(booking_day.isoformat(), "09:00", "mechanic2")
+    ).set({"booking_id": "other-booking"})
+    
+    assert _book(admin_client, booking_day).status_code == 201
+
+
+def _deny(client, booking_id, day):
+    return client.post(f"/bookings/{booking_id}/approval", json={"approved": False})
+
+
+def _cancel(client, booking_id, day):
+    return client.post(f"/bookings/{booking_id}/cancel", json={"reason": "Plans changed"})
+
+
+def _reschedule(client, booking_id, day):
+    return client.post(f"/bookings/{booking_id}/reschedule", json={
+        "reason": "Need a later time",
+        "preferred_slots": [{
+            "start": f"{day.isoformat()}T11:00:00",
+            "end": f"{day.isoformat()}T11:30:00",
+        }],
+    })
+
+
+def _status_cancelled(client, booking_id, day):
+    return client.patch(f"/bookings/{booking_id}/status", params={"status": "cancelled"})
+
+
+@pytest.mark.parametrize("release", [_deny, _cancel, _reschedule, _status_cancelled])
+def test_freeing_booking_releases_claim(admin_client, booking_day, clean_firestore, release):
+    booking_id = _book(admin_client, booking_day).json()["id"]
+    
+    response = release(admin_client, booking_id, booking_day)
+    assert response.status_code == 200
+    assert not _claim(clean_firestore, booking_day).exists
+    
+    # The slot can be booked again
+    rebooked = _book(admin_client, booking_day)
+    assert rebooked.status_code == 201
+    assert _claim(clean_firestore, booking_day).to_dict()["booking_id"] == rebooked.json()["id"]
+
+
+@pytest.mark.parametrize("release", [_deny, _status_cancelled])
+def test_releasing_inactive_booking_keeps_rebooked_claim(admin_client, booking_day, clean_firestore, release):
+    booking_id = _book(admin_client, booking_day).json()["id"]
+    assert _cancel(admin_client, booking_id, booking_day).status_code == 200
+    rebooked_id = _book(admin_client, booking_day).json()["id"]
+    
+    # The cancelled booking no longer holds the slot, so this must not free it
+    assert release(admin_client, booking_id, booking_day).status_code == 200
+    assert _claim(clean_firestore, booking_day).to_dict()["booking_id"] == rebooked_id
+    assert _book(admin_client, booking_day).status_code == 409
+
+
+def test_reactivating_booking_reclaims_slot(admin_client, booking_day, clean_firestore):
+    booking_id = _book(admin_client, booking_day).json()["id"]
+    assert _status_cancelled(admin_client, booking_id, booking_day).status_code == 200
+    
+    response = admin_client.patch(f"/bookings/{booking_id}/status", params={"status": "confirmed"})
+    assert response.status_code == 200
+    assert _claim(clean_firestore, booking_day).to_dict()["booking_id"] == booking_id
+
+
+def test_reactivating_booking_fails_when_slot_rebooked(admin_client, booking_day, clean_firestore):
+    booking_id = _book(admin_client, booking_day).json()["id"]
+    assert _cancel(admin_client, booking_id, booking_day).status_code == 200
+    rebooked_id = _book(admin_client, booking_day).json()["id"]
+    
+    response = admin_client.patch(f"/bookings/{booking_id}/status", params={"status": "confirmed"})
+    assert response.status_code == 409
+    assert _claim(clean_firestore, booking_day).to_dict()["booking_id"] == rebooked_id
+
+
+def test_long_booking_claims_every_slot_it_covers(admin_client, booking_day, clean_firestore):
+    booking_id = _book(admin_client, booking_day, "09:00", "long-service").json()["id"]
+    
+    for time in ("09:00", "09:30"):
+        assert _claim(clean_firestore, booking_day, time).to_dict()["booking_id"] == booking_id
+    assert not _claim(clean_firestore, booking_day, "10:00").exists
+    
+    # The second half of the long booking is taken too
+    assert _book(admin_client, booking_day, "09:30").status_code == 409
+
+
+def test_long_booking_rejected_when_a_later_slot_is_taken(admin_client, booking_day):
+    assert _book(admin_client, booking_day, "09:30").status_code == 201
+    assert _book(admin_client, booking_day, "09:00", "long-service").status_code == 409
+
+
+def test_cancelling_long_booking_releases_every_slot(admin_client, booking_day, clean_firestore):
+    booking_id = _book(admin_client, booking_day, "09:00", "long-service").json()["id"]
+    assert _cancel(admin_client, booking_id, booking_day).status_code == 200
+    
+    for time in ("09:00", "09:30"):
+        assert not _claim(clean_firestore, booking_day, time).exists
+    assert _book(admin_client, booking_day, "09:30").status_code == 201
@@ -2,11 +2,21 @@ import pytest
 from fastapi import HTTPException
 from datetime import datetime, timedelta
 import asyncio
-from google.cloud import firestore
-from backend.app.models import BookingCreate, BookingOut, SlotStatus
-from backend.app.routers.bookings import create_booking_with_transaction, SlotUnavailableError, ServiceNotFoundError, DayNotPublishedError
+from backend.app.models import BookingCreate, BookingStatus, SlotStatus
+from backend.app.services.booking_service import BookingService, SlotUnavailableError, ServiceNotFoundError
 
-pytestmark = pytest.mark.asyncio
+pytestmark = pytest.mark.emulator
+
+# Slot label -> (hour, minute) for every half-hour slot in the sample day
+_SLOT_TIMES = {f"{h:02d}:{m:02d}": (h, m) for h in range(8, 18) for m in (0, 30)}
+
+# Address fields every BookingCreate needs
+_CUSTOMER_ADDRESS = {
+    "customer_address": "1 Main St",
+    "customer_city": "Springfield",
+    "customer_state": "IL",
+    "customer_zip": "12345",
+}
 
 async def test_successful_booking_creation(clean_firestore, sample_data):
     """Test successful booking creation transaction."""
@@ -18,11 +28,8 @@ async def test_successful_booking_creation(clean_firestore, sample_data):
     
     # Create a datetime object for today's available slot
     today_date = datetime.fromisoformat(today)
-    time_parts = available_slot.split(":")
-    slot_start = datetime(
-        today_date.year, today_date.month, today_date.day,
-        int(time_parts[0]), int(time_parts[1])
-    )
+    hour, minute = _SLOT_TIMES[available_slot]
+    slot_start = datetime(today_date.year, today_date.month, today_date.day, hour, minute)
     
     # Create payload
     booking_payload = BookingCreate(
@@ -31,17 +38,20 @@ async def test_successful_booking_creation(clean_firestore, sample_data):
         customer_name="Test Customer",
         customer_email="test@example.com",
         customer_phone="555-123-4567",
-        notes="Test booking"
+        notes="Test booking",
+        **_CUSTOMER_ADDRESS
     )
     
     # Act
-    booking = await create_booking_with_transaction(db, booking_payload)
+    booking = await BookingService().create_booking(booking_payload)
     
     # Assert
     assert booking.id is not None
     assert booking.service_id == service_id
-    assert booking.slot_start == slot_start
-    assert booking.status == "confirmed"
+    assert booking.mechanic_id == sample_data["mechanic_id"]
+    # Firestore hands the naive start back as UTC
+    assert booking.slot_start.replace(tzinfo=None) == slot_start
+    assert booking.status == BookingStatus.PENDING.value
     
     # Verify slot is marked as booked
     availability_doc = db.collection("availability").document(today).get()
@@ -55,90 +65,37 @@ async def test_successful_booking_creation(clean_firestore, sample_data):
     assert booking_data["customer_email"] == "test@example.com"
     assert booking_data["service_name"] != "" # Should be populated
 
-async def test_booking_unavailable_slot(clean_firestore, sample_data):
-    """Test booking an already booked slot fails the transaction."""
-    # Arrange
-    db = clean_firestore
-    today = sample_data["today"]
-    service_id = sample_data["service_id"]
-    booked_slot = sample_data["booked_slot"]
-    
-    # Create a datetime object for today's booked slot
-    today_date = datetime.fromisoformat(today)
-    time_parts = booked_slot.split(":")
-    slot_start = datetime(
-        today_date.year, today_date.month, today_date.day,
-        int(time_parts[0]), int(time_parts[1])
-    )
-    
-    # Create payload for already booked slot
-    booking_payload = BookingCreate(
-        service_id=service_id,
-        slot_start=slot_start,
-        customer_name="Test Customer",
-        customer_email="test@example.com",
-        customer_phone="555-123-4567"
-    )
-    
-    # Act & Assert
-    with pytest.raises(SlotUnavailableError):
-        await create_booking_with_transaction(db, booking_payload)
-
-async def test_booking_nonexistent_service(clean_firestore, sample_data):
-    """Test booking with a non-existent service ID."""
-    # Arrange
-    db = clean_firestore
-    today = sample_data["today"]
-    available_slot = sample_data["available_slot"]
-    
-    # Create a datetime object for today's available slot
-    today_date = datetime.fromisoformat(today)
-    time_parts = available_slot.split(":")
-    slot_start = datetime(
-        today_date.year, today_date.month, today_date.day,
-        int(time_parts[0]), int(time_parts[1])
-    )
-    
-    # Create payload with non-existent service
-    booking_payload = BookingCreate(
-        service_id="nonexistent-service",
-        slot_start=slot_start,
-        customer_name="Test Customer",
-        customer_email="test@example.com",
-        customer_phone="555-123-4567"
-    )
-    
-    # Act & Assert
-    with pytest.raises(ServiceNotFoundError):
-        await create_booking_with_transaction(db, booking_payload)
-
-async def test_booking_nonexistent_day(clean_firestore, sample_data):
-    """Test booking on a day without published availability."""
+@pytest.mark.parametrize("case, expected_exc", [
+    ("booked_slot", SlotUnavailableError),
+    ("nonexistent_service", ServiceNotFoundError),
+    ("unscheduled_day", SlotUnavailableError),
+])
+async def test_booking_rejected(firestore_client, shared_sample_data, case, expected_exc):
+    """Test that invalid bookings fail the transaction without writing anything."""
     # Arrange
-    db = clean_firestore
-    service_id = sample_data["service_id"]
-    available_slot = sample_data["available_slot"]
+    db = firestore_client
+    service_id = shared_sample_data["service_id"]
+    slot = shared_sample_data["booked_slot" if case == "booked_slot" else "available_slot"]
     
-    # Create a datetime object for tomorrow (which doesn't have availability)
-    tomorrow = (datetime.now() + timedelta(days=1)).date()
-    time_parts = available_slot.split(":")
-    slot_start = datetime(
-        tomorrow.year, tomorrow.month, tomorrow.day,
-        int(time_parts[0]), int(time_parts[1])
-    )
+    # The seeded mechanic doesn't work the day after, so it has no free slots
+    day = datetime.fromisoformat(shared_sample_data["today"])
+    if case == "unscheduled_day":
+        day += timedelta(days=1)
+    hour, minute = _SLOT_TIMES[slot]
+    slot_start = datetime(day.year, day.month, day.day, hour, minute)
     
-    # Create payload for non-existent day
     booking_payload = BookingCreate(
-        service_id=service_id,
+        service_id="nonexistent-service" if case == "nonexistent_service" else service_id,
         slot_start=slot_start,
         customer_name="Test Customer",
         customer_email="test@example.com",
-        customer_phone="555-123-4567"
+        customer_phone="555-123-4567",
+        **_CUSTOMER_ADDRESS
     )
     
     # Act & Assert
-    with pytest.raises(DayNotPublishedError):
-        await create_booking_with_transaction(db, booking_payload)
+    with pytest.raises(expected_exc):
+        await BookingService().create_booking(booking_payload)
 
 async def test_concurrent_bookings_same_slot(clean_firestore, sample_data):
     """Test that concurrent bookings for the same slot are handled correctly."""
@@ -150,11 +107,8 @@ async def test_concurrent_bookings_same_slot(clean_firestore, sample_data):
     
     # Create a datetime object for today's available slot
     today_date = datetime.fromisoformat(today)
-    time_parts = available_slot.split(":")
-    slot_start = datetime(
-        today_date.year, today_date.month, today_date.day,
-        int(time_parts[0]), int(time_parts[1])
-    )
+    hour, minute = _SLOT_TIMES[available_slot]
+    slot_start = datetime(today_date.year, today_date.month, today_date.day, hour, minute)
     
     # Create identical booking payloads for two concurrent users
     booking_payload1 = BookingCreate(
@@ -162,7 +116,8 @@ async def test_concurrent_bookings_same_slot(clean_firestore, sample_data):
         slot_start=slot_start,
         customer_name="Customer 1",
         customer_email="customer1@example.com",
-        customer_phone="555-111-1111"
+        customer_phone="555-111-1111",
+        **_CUSTOMER_ADDRESS
     )
     
     booking_payload2 = BookingCreate(
@@ -170,29 +125,28 @@ async def test_concurrent_bookings_same_slot(clean_firestore, sample_data):
         slot_start=slot_start,
         customer_name="Customer 2",
         customer_email="customer2@example.com",
-        customer_phone="555-222-2222"
+        customer_phone="555-222-2222",
+        **_CUSTOMER_ADDRESS
     )
     
     # Act - Run both bookings concurrently
     results = {"success": 0, "failure": 0}
     
-    async def try_booking(payload, delay=0):
-        await asyncio.sleep(delay)  # Small delay to simulate concurrent requests
+    async def try_booking(payload):
         try:
-            booking = await create_booking_with_transaction(db, payload)
+            booking = await BookingService().create_booking(payload)
             results["success"] += 1
             return booking
         except SlotUnavailableError:
             results["failure"] += 1
             return None
     
-    # Run the bookings concurrently
-    booking_tasks = [
+    # Run the bookings concurrently so they contend for the slot
+    bookings = await asyncio.gather(
         try_booking(booking_payload1),
-        try_booking(booking_payload2, 0.1)  # Small delay for the second booking
-    ]
-    
-    bookings = await asyncio.gather(*booking_tasks, return_exceptions=True)
+        try_booking(booking_payload2),
+        return_exceptions=True
+    )
     
     # Assert - One should succeed, one should fail
     assert results["success"] == 1
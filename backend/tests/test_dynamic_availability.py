@@ -2,7 +2,64 @@ import pytest
 from datetime import date, datetime, timedelta
 from unittest.mock import Mock, patch
 from backend.app.routers.availability import _generate_availability_for_day, _get_cached_availability
-from backend.app.models import Mechanic, MechanicSchedule, DaySchedule, Slot
+from backend.app.models import Mechanic, Slot
+
+
+# Mechanic document as stored in Firestore, shared by the generation tests
+_MECH_DICT = {
+    "name": "John Doe",
+    "email": "john@example.com",
+    "specialties": ["service_1", "service_2"],
+    "schedule": {
+        "monday": {"start": "08:00", "end": "17:00"},
+        "tuesday": {"start": "08:00", "end": "17:00"},
+        "wednesday": {"start": "08:00", "end": "17:00"},
+        "thursday": {"start": "08:00", "end": "17:00"},
+        "friday": {"start": "08:00", "end": "17:00"},
+        "saturday": None,
+        "sunday": None
+    },
+    "active": True
+}
+
+
+class FakeDoc:
+    """Minimal stand-in for a Firestore DocumentSnapshot."""
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """Query stand-in that records filters and streams fixed documents."""
+
+    def __init__(self, docs):
+        self._docs = docs
+        self.filters = []
+
+    def where(self, *args, **kwargs):
+        self.filters.append(args)
+        return self
+
+    def stream(self):
+        return iter(self._docs)
+
+
+class FakeDB:
+    """Firestore client stand-in that serves documents by collection name."""
+
+    def __init__(self, data):
+        self.data = data
+        self.queries = {}
+
+    def collection(self, name):
+        query = FakeQuery(self.data.get(name, []))
+        self.queries[name] = query
+        return query
 
 
 class TestDynamicAvailability:
@@ -14,58 +71,25 @@ class TestDynamicAvailability:
         return Mock()
 
     @pytest.fixture
+    def sample_mechanic_dict(self):
+        """Mechanic document data, copied so tests may mutate it."""
+        return _MECH_DICT.copy()
+
+    @pytest.fixture(scope="module")
     def sample_mechanic(self):
         """Create a sample mechanic for testing."""
-        schedule = MechanicSchedule(
-            monday=DaySchedule(start="08:00", end="17:00"),
-            tuesday=DaySchedule(start="08:00", end="17:00"),
-            wednesday=DaySchedule(start="08:00", end="17:00"),
-            thursday=DaySchedule(start="08:00", end="17:00"),
-            friday=DaySchedule(start="08:00", end="17:00"),
-            saturday=None,
-            sunday=None
-        )
-        
-        return Mechanic(
-            id="mechanic_1",
-            name="John Doe",
-            email="john@example.com",
-            specialties=["service_1", "service_2"],
-            schedule=schedule,
-            active=True
-        )
-
-    @pytest.mark.asyncio
-    async def test_generate_availability_for_weekday(self, mock_db, sample_mechanic):
+        return Mechanic.model_validate({"id": "mechanic_1", **_MECH_DICT})
+
+    async def test_generate_availability_for_weekday(self, sample_mechanic_dict):
         """Test availability generation for a weekday."""
-        # Mock the mechanics query
-        mock_doc = Mock()
-        mock_doc.to_dict.return_value = {
-            "name": sample_mechanic.name,
-            "email": sample_mechanic.email,
-            "specialties": sample_mechanic.specialties,
-            "schedule": {
-                "monday": {"start": "08:00", "end": "17:00"},
-                "tuesday": {"start": "08:00", "end": "17:00"},
-                "wednesday": {"start": "08:00", "end": "17:00"},
-                "thursday": {"start": "08:00", "end": "17:00"},
-                "friday": {"start": "08:00", "end": "17:00"},
-                "saturday": None,
-                "sunday": None
-            },
-            "active": True
-        }
-        mock_doc.id = "mechanic_1"
-        
-        mock_db.collection.return_value.where.return_value.stream.return_value = [mock_doc]
-        
-        # Mock empty bookings query
-        mock_db.collection.return_value.where.return_value.where.return_value.where.return_value.stream.return_value = []
+        # One active mechanic and no bookings
+        mech_doc = FakeDoc("mechanic_1", sample_mechanic_dict)
+        db = FakeDB({"mechanics": [mech_doc], "bookings": []})
         
         # Test for a Monday
         test_date = date(2025, 6, 16)  # A Monday
         
-        slots = await _generate_availability_for_day(mock_db, test_date)
+        slots = await _generate_availability_for_day(db, test_date)
         
         # Should generate slots from 08:00 to 17:00 with 30-minute intervals
         assert len(slots) > 0
@@ -77,62 +101,17 @@ class TestDynamicAvailability:
         assert first_slot.start.endswith("T08:00:00")
         assert first_slot.end.endswith("T08:00:00")
 
-    @pytest.mark.asyncio
-    async def test_generate_availability_with_service_filter(self, mock_db, sample_mechanic):
+    async def test_generate_availability_with_service_filter(self, sample_mechanic_dict):
         """Test availability generation with service filtering."""
-        # Mock the mechanics query with service filter
-        mock_doc = Mock()
-        mock_doc.to_dict.return_value = {
-            "name": sample_mechanic.name,
-            "email": sample_mechanic.email,
-            "specialties": sample_mechanic.specialties,
-            "schedule": {
-                "monday": {"start": "08:00", "end": "17:00"},
-                "tuesday": {"start": "08:00", "end": "17:00"},
-                "wednesday": {"start": "08:00", "end": "17:00"},
-                "thursday": {"start": "08:00", "end": "17:00"},
-                "friday": {"start": "08:00", "end": "17:00"},
-                "saturday": None,
-                "sunday": None
-            },
-            "active": True
-        }
-        mock_doc.id = "mechanic_1"
-        
-        # Mock the query chain for service filtering
-        mock_collection = Mock()
-        mock_where_active = Mock()
-        mock_where_service = Mock()
-        
-        mock_db.collection.return_value = mock_collection
-        mock_collection.where.return_value = mock_where_active
-        mock_where_active.where.return_value = mock_where_service
-        mock_where_service.stream.return_value = [mock_doc]
-        
-        # Mock empty bookings query
-        mock_bookings_collection = Mock()
-        mock_bookings_where1 = Mock()
-        mock_bookings_where2 = Mock()
-        mock_bookings_where3 = Mock()
-        
-        # Set up the booking query chain
-        def collection_side_effect(name):
-            if name == "mechanics":
-                return mock_collection
-            elif name == "bookings":
-                return mock_bookings_collection
-            
-        mock_db.collection.side_effect = collection_side_effect
-        mock_bookings_collection.where.return_value = mock_bookings_where1
-        mock_bookings_where1.where.return_value = mock_bookings_where2
-        mock_bookings_where2.where.return_value = mock_bookings_where3
-        mock_bookings_where3.stream.return_value = []
+        # One active mechanic offering the service and no bookings
+        mech_doc = FakeDoc("mechanic_1", sample_mechanic_dict)
+        db = FakeDB({"mechanics": [mech_doc], "bookings": []})
         
         # Test for a Monday with service filter
         test_date = date(2025, 6, 16)  # A Monday
         service_id = "service_1"
         
-        slots = await _generate_availability_for_day(mock_db, test_date, service_id)
+        slots = await _generate_availability_for_day(db, test_date, service_id)
         
         # Should generate slots for the mechanic who can perform this service
         assert len(slots) > 0
@@ -140,41 +119,22 @@ class TestDynamicAvailability:
         assert all(slot.mechanic_id == "mechanic_1" for slot in slots)
         
         # Verify the service filter was applied
-        mock_where_active.where.assert_called_with("specialties", "array_contains", service_id)
+        assert ("specialties", "array_contains", service_id) in db.queries["mechanics"].filters
 
-    @pytest.mark.asyncio
-    async def test_generate_availability_for_weekend(self, mock_db, sample_mechanic):
+    async def test_generate_availability_for_weekend(self, sample_mechanic_dict):
         """Test availability generation for a weekend day (should be empty)."""
-        # Mock the mechanics query
-        mock_doc = Mock()
-        mock_doc.to_dict.return_value = {
-            "name": sample_mechanic.name,
-            "email": sample_mechanic.email,
-            "specialties": sample_mechanic.specialties,
-            "schedule": {
-                "monday": {"start": "08:00", "end": "17:00"},
-                "tuesday": {"start": "08:00", "end": "17:00"},
-                "wednesday": {"start": "08:00", "end": "17:00"},
-                "thursday": {"start": "08:00", "end": "17:00"},
-                "friday": {"start": "08:00", "end": "17:00"},
-                "saturday": None,
-                "sunday": None
-            },
-            "active": True
-        }
-        mock_doc.id = "mechanic_1"
-        
-        mock_db.collection.return_value.where.return_value.stream.return_value = [mock_doc]
+        # One active mechanic who does not work weekends
+        mech_doc = FakeDoc("mechanic_1", sample_mechanic_dict)
+        db = FakeDB({"mechanics": [mech_doc]})
         
         # Test for a Saturday
         test_date = date(2025, 6, 21)  # A Saturday
         
-        slots = await _generate_availability_for_day(mock_db, test_date)
+        slots = await _generate_availability_for_day(db, test_date)
         
         # Should generate no slots for weekend
         assert len(slots) == 0
 
-    @pytest.mark.asyncio
     async def test_cached_availability_with_service_filter(self, mock_db):
         """Test that service-specific requests bypass cache."""
         # Mock a cached availability document
@@ -200,7 +160,6 @@ class TestDynamicAvailability:
         cached_result_with_service = await _get_cached_availability(mock_db, test_date, "service_1")
         assert cached_result_with_service is None
 
-    @pytest.mark.asyncio
     async def test_expired_cache_handling(self, mock_db):
         """Test that expired cache is ignored."""
         # Mock an expired cached availability document
@@ -1,8 +1,4 @@
-from fastapi.testclient import TestClient
-from app.main import app
-
-def test_health():
-    client = TestClient(app)
-    r = client.get("/healthz")
+def test_health(app_client):
+    r = app_client.get("/healthz")
     assert r.status_code == 200
     assert r.json() == {"status": "ok"}
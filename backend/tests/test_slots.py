@@ -1,6 +1,6 @@
 import pytest
 from datetime import datetime
-from backend.app.utils.slots import build_slots
+from backend.app.utils.slots import build_slots, covered_slots
 
 
 def test_build_slots_default_granularity():
@@ -74,4 +74,15 @@ def test_build_slots_end_before_start():
         build_slots("12:00", "09:00")  # End before start
     
     with pytest.raises(ValueError):
-        build_slots("09:00", "09:00")  # End equal to start 
\ No newline at end of file
+        build_slots("09:00", "09:00")  # End equal to start 
+
+
+@pytest.mark.parametrize("duration, expected", [
+    (0, ["09:00"]),
+    (30, ["09:00"]),
+    (45, ["09:00", "09:30"]),
+    (90, ["09:00", "09:30", "10:00"]),
+])
+def test_covered_slots(duration, expected):
+    """Test a booking covers its start slot plus one slot per further 30 minutes."""
+    assert covered_slots("09:00", duration) == expected
@@ -0,0 +1,304 @@
+import asyncio
+import orjson
+import pytest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def worker_client(worker):
+    """TestClient for the worker app without running its startup hook."""
+    return TestClient(worker.app)
+
+
+def _notification(booking_id="booking-1"):
+    return {
+        "booking_id": booking_id,
+        "notification_type": "confirmation",
+        "data": {"notification_type": "confirmation"},
+    }
+
+
+@pytest.mark.parametrize("path", ["/process-notification", "/process-notifications-batch"])
+def test_undecodable_body_is_bad_request(worker_client, path):
+    response = worker_client.post(path, content=b'{"booking_id": ', headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_notification_with_wrong_shape_is_unprocessable(worker_client):
+    response = worker_client.post("/process-notification", json={"booking_id": 1})
+    assert response.status_code == 422
+
+
+def test_batch_with_wrong_shape_is_unprocessable(worker_client):
+    response = worker_client.post("/process-notifications-batch", json={"items": []})
+    assert response.status_code == 422
+
+
+def _large_batch(worker):
+    """Batch body big enough to take the streaming parser path."""
+    items = [
+        {**_notification(f"booking-{index}"), "data": {"notification_type": "confirmation", "notes": "x" * 500}}
+        for index in range(100)
+    ]
+    body = orjson.dumps({"items": items})
+    assert len(body) > worker.STREAM_BODY_THRESHOLD
+    return body
+
+
+def test_large_batch_is_streamed(worker, worker_client):
+    response = worker_client.post(
+        "/process-notifications-batch", content=_large_batch(worker), headers={"content-type": "application/json"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 100
+    assert results[-1] == {"booking_id": "booking-99", "status": "success", "message": "No email to send"}
+
+
+def test_truncated_large_batch_is_bad_request(worker, worker_client):
+    body = _large_batch(worker)[:-10]
+    response = worker_client.post(
+        "/process-notifications-batch", content=body, headers={"content-type": "application/json"}
+    )
+    assert response.status_code == 400
+
+
+def test_worker_starts_without_credentials(worker, monkeypatch):
+    import email_service
+    import google.auth
+    from google.auth.exceptions import DefaultCredentialsError
+    
+    def no_credentials(*args, **kwargs):
+        raise DefaultCredentialsError("No credentials in tests")
+    
+    monkeypatch.setattr(google.auth, "default", no_credentials)
+    monkeypatch.setenv("SMTP2GO_USERNAME", "smtp-user")
+    try:
+        with TestClient(worker.app) as client:
+            assert client.get("/healthz").status_code == 200
+        assert email_service.get_email_config()["smtp_username"] == "smtp-user"
+    finally:
+        email_service.get_email_config.cache_clear()
+
+
+def test_email_config_is_reread_after_secret_ttl(worker, monkeypatch):
+    import email_service
+    
+    monkeypatch.setenv("SMTP2GO_PASSWORD", "old-password")
+    email_service.get_email_config.cache_clear()
+    try:
+        assert email_service.get_email_config()["smtp_password"] == "old-password"
+        monkeypatch.setenv("SMTP2GO_PASSWORD", "rotated-password")
+        assert email_service.get_email_config()["smtp_password"] == "old-password"
+        
+        # Expire the cached config as if SECRET_TTL_SECONDS had passed
+        email_service.get_email_config.cache.expire(time=float("inf"))
+        assert email_service.get_email_config()["smtp_password"] == "rotated-password"
+    finally:
+        email_service.get_email_config.cache_clear()
+
+
+def test_notification_is_sent_before_acknowledging_by_default(worker, worker_client):
+    assert not worker.SEND_IN_BACKGROUND
+    response = worker_client.post("/process-notification", json=_notification())
+    assert response.json() == {"status": "success", "message": "No email to send"}
+
+
+async def test_dropped_background_notification_logs_error(worker, monkeypatch, caplog):
+    async def failing_send(notification):
+        raise worker.EmailServiceError("SMTP down")
+    
+    async def no_sleep(delay):
+        pass
+    
+    monkeypatch.setattr(worker, "_send_notification", failing_send)
+    monkeypatch.setattr(worker.asyncio, "sleep", no_sleep)
+    
+    await worker._send_in_background(_notification())
+    
+    dropped = [record for record in caplog.records if record.getMessage().startswith("Notification dropped")]
+    assert len(dropped) == 1
+    assert dropped[0].levelname == "ERROR"
+    assert "booking-1" in dropped[0].getMessage()
+
+
+class FakeSMTP:
+    """Stand-in for aiosmtplib.SMTP that records sends and can drop its connection."""
+    
+    instances = []
+    
+    def __init__(self, hostname, port, start_tls):
+        self.connected = False
+        self.drop_on_send = False
+        self.refuse_send = False
+        self.sent = []
+        FakeSMTP.instances.append(self)
+    
+    async def connect(self):
+        self.connected = True
+    
+    async def starttls(self):
+        pass
+    
+    async def login(self, username, password):
+        pass
+    
+    async def noop(self):
+        import aiosmtplib
+        
+        if not self.connected:
+            raise aiosmtplib.SMTPServerDisconnected("Connection lost")
+        return SimpleNamespace(code=250)
+    
+    async def send_message(self, message):
+        import aiosmtplib
+        
+        if self.drop_on_send:
+            self.connected = False
+            raise aiosmtplib.SMTPServerDisconnected("Connection lost")
+        if self.refuse_send:
+            raise aiosmtplib.SMTPResponseException(550, "Mailbox unavailable")
+        self.sent.append(message)
+    
+    async def quit(self):
+        self.connected = False
+    
+    def close(self):
+        self.connected = False
+
+
+@pytest.fixture
+def email_service(worker, monkeypatch):
+    """email_service with SMTP replaced by FakeSMTP and an empty connection pool."""
+    import aiosmtplib
+    import email_service
+    
+    async def email_config():
+        return {"smtp_username": "user", "smtp_password": "password", "from_email": "noreply@example.com"}
+    
+    FakeSMTP.instances = []
+    monkeypatch.setattr(aiosmtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(email_service, "_email_config", email_config)
+    monkeypatch.setattr(email_service, "_smtp_pool", asyncio.LifoQueue(maxsize=email_service.SMTP_POOL_SIZE))
+    monkeypatch.setattr(email_service, "_smtp_slots", asyncio.Semaphore(email_service.SMTP_POOL_SIZE))
+    return email_service
+
+
+async def _send(email_service, to_email="customer@example.com"):
+    return await email_service.send_email(to_email, "Booking update", "<p>Hello</p>")
+
+
+async def test_send_email_reuses_pooled_connection(email_service):
+    assert await _send(email_service)
+    assert await _send(email_service)
+    
+    assert len(FakeSMTP.instances) == 1
+    assert len(FakeSMTP.instances[0].sent) == 2
+    assert email_service._smtp_pool.qsize() == 1
+
+
+async def test_send_email_reconnects_when_pooled_connection_died(email_service):
+    assert await _send(email_service)
+    FakeSMTP.instances[0].connected = False
+    
+    assert await _send(email_service)
+    
+    assert len(FakeSMTP.instances) == 2
+    assert len(FakeSMTP.instances[1].sent) == 1
+    assert email_service._smtp_pool.get_nowait() is FakeSMTP.instances[1]
+
+
+async def test_send_email_reconnects_when_connection_drops_mid_send(email_service):
+    assert await _send(email_service)
+    FakeSMTP.instances[0].drop_on_send = True
+    
+    assert await _send(email_service)
+    
+    first, second = FakeSMTP.instances
+    assert len(first.sent) == 1
+    assert len(second.sent) == 1
+    assert email_service._smtp_pool.get_nowait() is second
+
+
+async def test_failed_send_releases_connection_to_pool(email_service, monkeypatch):
+    # A single slot, so a leaked slot would block the next send
+    monkeypatch.setattr(email_service, "_smtp_slots", asyncio.Semaphore(1))
+    assert await _send(email_service)
+    FakeSMTP.instances[0].refuse_send = True
+    
+    with pytest.raises(email_service.EmailServiceError):
+        await _send(email_service)
+    assert email_service._smtp_pool.qsize() == 1
+    
+    FakeSMTP.instances[0].refuse_send = False
+    assert await asyncio.wait_for(_send(email_service), timeout=1)
+    assert len(FakeSMTP.instances) == 1
+    assert len(FakeSMTP.instances[0].sent) == 2
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the shared Redis cache."""
+    
+    def __init__(self):
+        self.values = {}
+    
+    def get(self, key):
+        return self.values.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+@pytest.fixture
+def shared_secret_cache(worker, monkeypatch):
+    """secret_manager with an encrypted shared cache backed by FakeRedis and an empty local cache."""
+    import secret_manager
+    from cachetools import TTLCache
+    from cryptography.fernet import Fernet
+    
+    shared = FakeRedis()
+    monkeypatch.setattr(secret_manager, "SECRET_CACHE_KEY", Fernet.generate_key().decode())
+    monkeypatch.setattr(secret_manager, "get_shared_cache", lambda: shared)
+    monkeypatch.setattr(secret_manager, "_secret_cache", TTLCache(maxsize=32, ttl=secret_manager.SECRET_TTL_SECONDS))
+    secret_manager._shared_cache_cipher.cache_clear()
+    yield secret_manager, shared
+    secret_manager._shared_cache_cipher.cache_clear()
+
+
+def test_shared_secret_cache_stores_only_ciphertext(shared_secret_cache):
+    secret_manager, shared = shared_secret_cache
+    secret_manager._cache_secret("projects/p/secrets/SMTP2GO_PASSWORD/versions/latest", "hunter2")
+    
+    stored = shared.values["projects/p/secrets/SMTP2GO_PASSWORD/versions/latest"]
+    assert b"hunter2" not in stored
+    
+    # A sibling process with an empty local cache reads it back from the shared cache
+    secret_manager._secret_cache.clear()
+    assert secret_manager._cached_secret("projects/p/secrets/SMTP2GO_PASSWORD/versions/latest") == "hunter2"
+
+
+def test_shared_secret_cache_ignores_stale_entries(shared_secret_cache, monkeypatch):
+    import time
+    
+    secret_manager, shared = shared_secret_cache
+    secret_manager._cache_secret("projects/p/secrets/FROM_EMAIL/versions/latest", "noreply@example.com")
+    secret_manager._secret_cache.clear()
+    
+    # Past the shared TTL the token is rejected even though the fake Redis never expires it
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + secret_manager.SHARED_SECRET_TTL_SECONDS + 1)
+    assert secret_manager._cached_secret("projects/p/secrets/FROM_EMAIL/versions/latest") is None
+
+
+def test_unknown_notification_type_is_acknowledged_with_error(worker_client):
+    notification = {**_notification(), "data": {"notification_type": "carrier_pigeon", "email": {"to": "a@example.com"}}}
+    
+    response = worker_client.post("/process-notification", json=notification)
+    assert response.status_code == 200
+    assert response.json() == {"status": "error", "message": "Unknown notification type: carrier_pigeon"}
+    
+    response = worker_client.post("/process-notifications-batch", json={"items": [notification]})
+    assert response.json()["results"] == [
+        {"booking_id": "booking-1", "status": "error", "message": "Unknown notification type: carrier_pigeon"}
+    ]
@@ -2,15 +2,24 @@
 Email service using SMTP2GO for sending booking notifications.
 """
 import os
-import smtplib
+import asyncio
 import logging
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from jinja2 import Environment, FileSystemLoader
-from urllib.parse import urlencode
-from datetime import datetime
-from typing import Dict, Any, Optional
-from secret_manager import get_secret_or_env
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+import tempfile
+from urllib.parse import quote_plus
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Any, Mapping, Optional
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from starlette.concurrency import run_in_threadpool
+from secret_manager import SECRET_TTL_SECONDS, get_secret_async, get_secret_or_env
+
+# aiosmtplib, email.message and jinja2 are imported on first use to keep cold starts cheap
+if TYPE_CHECKING:
+    import aiosmtplib
+    from jinja2 import Environment
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +27,15 @@ logger = logging.getLogger(__name__)
 SMTP_SERVER = "mail.smtp2go.com"
 SMTP_PORT = 2525
 
+@cached(TTLCache(maxsize=1, ttl=SECRET_TTL_SECONDS), lock=threading.Lock())
 def get_email_config():
-    """Get email configuration from Secret Manager with fallback to environment variables."""
+    """
+    Get email configuration from Secret Manager with fallback to environment variables.
+    
+    The result is returned read-only and reused for as long as the secrets
+    themselves are cached, so rotated SMTP credentials are picked up without
+    a restart.
+    """
     # Get raw values
     username = get_secret_or_env("SMTP2GO_USERNAME", "SMTP2GO_USERNAME")
     password = get_secret_or_env("SMTP2GO_PASSWORD", "SMTP2GO_PASSWORD")
@@ -30,42 +46,145 @@ def get_email_config():
     if password:
         password = password.strip()
     
-    return {
+    return MappingProxyType({
         'smtp_username': username,
         'smtp_password': password,
         'from_email': get_secret_or_env("FROM_EMAIL", "FROM_EMAIL", "noreply@yourmechanicservice.com"),
         'booking_url': get_secret_or_env("BOOKING_URL", "BOOKING_URL", "https://yourdomain.com/book")
-    }
+    })
+
+# Secrets read by get_email_config, fetched concurrently at startup
+EMAIL_SECRETS = ("SMTP2GO_USERNAME", "SMTP2GO_PASSWORD", "FROM_EMAIL", "BOOKING_URL")
+
+async def preload_email_config() -> None:
+    """
+    Resolve the email configuration before the first request arrives.
+    
+    The Secret Manager lookups are awaited concurrently on the asyncio client
+    so they fill the secret cache; missing secrets are left to the env
+    fallback.
+    """
+    await asyncio.gather(
+        *(get_secret_async(name) for name in EMAIL_SECRETS),
+        return_exceptions=True,
+    )
+    await _email_config()
 
-# Initialize Jinja2 environment
-template_env = Environment(loader=FileSystemLoader('templates'))
+async def _email_config() -> Mapping[str, Any]:
+    """Return the email config, resolving the blocking Secret Manager lookups in a worker thread on first use."""
+    if hashkey() in get_email_config.cache:
+        return get_email_config()
+    return await run_in_threadpool(get_email_config)
+
+# Idle authenticated SMTP2GO connections, most recently used first;
+# _smtp_slots caps how many connections are open at once
+SMTP_POOL_SIZE = 8
+_smtp_pool: "asyncio.LifoQueue[aiosmtplib.SMTP]" = asyncio.LifoQueue(maxsize=SMTP_POOL_SIZE)
+_smtp_slots = asyncio.Semaphore(SMTP_POOL_SIZE)
+
+async def _connect(config: Mapping[str, Any]) -> "aiosmtplib.SMTP":
+    """Open, secure and authenticate a new SMTP2GO connection."""
+    import aiosmtplib
+    
+    client = aiosmtplib.SMTP(hostname=SMTP_SERVER, port=SMTP_PORT, start_tls=False)
+    await client.connect()
+    await client.starttls()
+    await client.login(config['smtp_username'], config['smtp_password'])
+    logger.debug("Opened SMTP connection", extra={"smtp_server": SMTP_SERVER, "smtp_port": SMTP_PORT})
+    return client
+
+async def _close_connection(client: "aiosmtplib.SMTP") -> None:
+    """Quit an SMTP connection, ignoring errors from an already dropped session."""
+    import aiosmtplib
+    
+    try:
+        await client.quit()
+    except (aiosmtplib.SMTPException, OSError):
+        client.close()
+
+async def _checkout(config: Mapping[str, Any]) -> "aiosmtplib.SMTP":
+    """Take a live connection from the pool, opening a new one if none is idle. Call with an _smtp_slots slot held."""
+    import aiosmtplib
+    
+    while not _smtp_pool.empty():
+        client = _smtp_pool.get_nowait()
+        try:
+            response = await client.noop()
+            if response.code == 250:
+                return client
+        except (aiosmtplib.SMTPException, OSError):
+            pass
+        await _close_connection(client)
+    
+    return await _connect(config)
+
+async def close_smtp_connection() -> None:
+    """Quit every pooled SMTP connection; called when the worker shuts down."""
+    while not _smtp_pool.empty():
+        await _close_connection(_smtp_pool.get_nowait())
+
+# Templates shipped with the worker, compiled together on first render
+EMAIL_TEMPLATES = (
+    'confirmation.html',
+    'approval.html',
+    'denial.html',
+    'cancellation.html',
+    'reschedule_request.html',
+    'reschedule_admin_notification.html',
+    'customer_invitation.html',
+)
+
+@lru_cache(maxsize=1)
+def _env() -> "Environment":
+    """Build the Jinja2 environment on first use and compile every known template once."""
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    
+    # Bytecode cache; templates don't change at runtime
+    cache_dir = os.path.join(tempfile.gettempdir(), 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader('templates'),
+        bytecode_cache=FileSystemBytecodeCache(directory=cache_dir),
+        auto_reload=False,
+        cache_size=400,
+    )
+    for template_name in EMAIL_TEMPLATES:
+        env.get_template(template_name)
+    return env
 
 class EmailServiceError(Exception):
     """Raised when email sending fails."""
     pass
 
-def generate_calendar_link(booking_data: Dict[str, Any], mechanic_phone: str) -> str:
+# Fixed part of every Google Calendar "add event" link
+_GCAL_PREFIX = "https://calendar.google.com/calendar/render?action=TEMPLATE&"
+
+def _gcal_fmt(dt: datetime) -> str:
+    """Format a datetime as Google Calendar's YYYYMMDDTHHMMSS."""
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
+
+def generate_calendar_link(booking_data: Dict[str, Any], mechanic_phone: str, duration_minutes: int = 60) -> str:
     """
     Generate a Google Calendar link for the appointment.
     
     Args:
         booking_data: Booking information
         mechanic_phone: Mechanic's phone number
+        duration_minutes: Length of the appointment (defaults to 1 hour)
         
     Returns:
         Google Calendar URL
     """
     try:
         # Parse appointment datetime
-        appointment_datetime = datetime.fromisoformat(booking_data['appointment_date'] + 'T' + booking_data['appointment_time'])
+        appointment_datetime = datetime.fromisoformat(f"{booking_data['appointment_date']}T{booking_data['appointment_time']}")
         
-        # Calculate end time (assume 1 hour if no duration specified)
-        # In a real implementation, you'd get this from the service duration
-        end_datetime = appointment_datetime.replace(hour=appointment_datetime.hour + 1)
+        # Calculate end time from the booked duration (rolls over midnight correctly)
+        end_datetime = appointment_datetime + timedelta(minutes=duration_minutes)
         
         # Format for Google Calendar (YYYYMMDDTHHMMSSZ)
-        start_time = appointment_datetime.strftime("%Y%m%dT%H%M%S")
-        end_time = end_datetime.strftime("%Y%m%dT%H%M%S")
+        start_time = _gcal_fmt(appointment_datetime)
+        end_time = _gcal_fmt(end_datetime)
         
         # Build location string
         location = f"{booking_data['customer_address']}, {booking_data['customer_city']}, {booking_data['customer_state']} {booking_data['customer_zip']}"
@@ -73,23 +192,21 @@ def generate_calendar_link(booking_data: Dict[str, Any], mechanic_phone: str) ->
         # Build event details
         details = f"Mobile Mechanic Service\\n\\nService: {booking_data['service_name']}\\nMechanic Phone: {mechanic_phone}\\nBooking ID: {booking_data['booking_id']}\\n\\nLocation: {location}"
         
-        # Build calendar parameters
-        params = {
-            "action": "TEMPLATE",
-            "text": f"Mobile Mechanic - {booking_data['service_name']}",
-            "dates": f"{start_time}/{end_time}",
-            "details": details,
-            "location": location
-        }
-        
-        base_url = "https://calendar.google.com/calendar/render"
-        return f"{base_url}?{urlencode(params)}"
+        # Quote only the dynamic parameters onto the prebuilt prefix
+        quote = quote_plus
+        text = f"Mobile Mechanic - {booking_data['service_name']}"
+        return (
+            f"{_GCAL_PREFIX}text={quote(text)}"
+            f"&dates={quote(f'{start_time}/{end_time}')}"
+            f"&details={quote(details)}"
+            f"&location={quote(location)}"
+        )
         
-    except Exception as e:
+    except (KeyError, ValueError) as e:
         logger.error(f"Error generating calendar link: {str(e)}")
         return ""
 
-def send_email(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> bool:
+async def send_email(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> bool:
     """
     Send an email using SMTP2GO.
     
@@ -105,57 +222,49 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: Opt
     Raises:
         EmailServiceError: If email sending fails
     """
-    config = get_email_config()
-    
-    # Debug logging for authentication (log username but not password)
-    logger.info(f"SMTP Configuration - Username: {config['smtp_username'][:5]}...{config['smtp_username'][-3:] if len(config['smtp_username']) > 8 else '[MASKED]'}")
-    logger.info(f"SMTP Configuration - Username length: {len(config['smtp_username'])}")
-    logger.info(f"SMTP Configuration - Username repr: {repr(config['smtp_username'][:10])}")  # Show any hidden chars
-    logger.info(f"SMTP Configuration - Password length: {len(config['smtp_password']) if config['smtp_password'] else 0}")
-    logger.info(f"SMTP Configuration - Password repr: {repr(config['smtp_password'][:5]) if config['smtp_password'] else 'None'}")  # Show any hidden chars
-    logger.info(f"SMTP Configuration - From email: {config['from_email']}")
+    config = await _email_config()
     
     if not config['smtp_username'] or not config['smtp_password']:
         raise EmailServiceError("SMTP2GO credentials not configured")
     
+    import aiosmtplib
+    from email.message import EmailMessage
+    
     try:
         # Create message
-        msg = MIMEMultipart('alternative')
+        msg = EmailMessage()
         msg['Subject'] = subject
         msg['From'] = config['from_email']
         msg['To'] = to_email
         
-        # Add text part if provided
+        # HTML body, as an alternative to the text part if one is provided
         if text_content:
-            text_part = MIMEText(text_content, 'plain')
-            msg.attach(text_part)
-        
-        # Add HTML part
-        html_part = MIMEText(html_content, 'html')
-        msg.attach(html_part)
-        
-        # Send email via SMTP2GO
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            logger.info(f"Connected to SMTP server {SMTP_SERVER}:{SMTP_PORT}")
-            server.starttls()
-            logger.info("STARTTLS completed successfully")
-            
-            # Log the login attempt (but not the actual credentials)
-            logger.info(f"Attempting SMTP login with username: {config['smtp_username']}")
-            server.login(config['smtp_username'], config['smtp_password'])
-            logger.info("SMTP login successful")
-            
-            server.send_message(msg)
-            logger.info("Email message sent successfully")
+            msg.set_content(text_content)
+            msg.add_alternative(html_content, subtype='html')
+        else:
+            msg.set_content(html_content, subtype='html')
+        
+        # Send email over a pooled SMTP2GO connection, reconnecting once if it dropped
+        async with _smtp_slots:
+            client = await _checkout(config)
+            try:
+                try:
+                    await client.send_message(msg)
+                except aiosmtplib.SMTPServerDisconnected:
+                    await _close_connection(client)
+                    client = await _connect(config)
+                    await client.send_message(msg)
+            finally:
+                # Returned even after a failed send; the next checkout checks it is still alive
+                _smtp_pool.put_nowait(client)
         
         logger.info(f"Email sent successfully to {to_email}")
         return True
         
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {str(e)}")
-        raise EmailServiceError(f"Email sending failed: {str(e)}")
+    except (aiosmtplib.SMTPException, OSError) as e:
+        raise EmailServiceError(f"Email sending failed: {e}") from e
 
-def render_email_template(template_name: str, template_data: Dict[str, Any]) -> str:
+def render_email_template(template_name: str, template_data: Mapping[str, Any]) -> str:
     """
     Render an email template with the provided data.
     
@@ -166,166 +275,88 @@ def render_email_template(template_name: str, template_data: Dict[str, Any]) ->
     Returns:
         Rendered HTML content
     """
-    try:
-        template = template_env.get_template(template_name)
-        return template.render(**template_data)
-    except Exception as e:
-        logger.error(f"Failed to render template {template_name}: {str(e)}")
-        raise EmailServiceError(f"Template rendering failed: {str(e)}")
-
-def send_confirmation_email(booking_data: Dict[str, Any]) -> bool:
-    """
-    Send a booking confirmation email.
+    from jinja2 import TemplateError
     
-    Args:
-        booking_data: Booking information
-        
-    Returns:
-        True if email was sent successfully
-    """
     try:
-        subject = f"Booking Confirmation - {booking_data['service_name']}"
-        html_content = render_email_template('confirmation.html', booking_data)
-        
-        return send_email(
-            to_email=booking_data['customer_email'],
-            subject=subject,
-            html_content=html_content
-        )
-    except Exception as e:
-        logger.error(f"Failed to send confirmation email: {str(e)}")
-        return False
+        return _env().get_template(template_name).render(template_data)
+    except TemplateError as e:
+        raise EmailServiceError(f"Template rendering failed for {template_name}: {e}") from e
 
-def send_approval_email(booking_data: Dict[str, Any], mechanic_phone: str) -> bool:
+async def _dispatch(
+    template_name: str,
+    booking_data: Mapping[str, Any],
+    subject: str,
+    extra: Optional[Mapping[str, Any]] = None,
+    to_email: Optional[str] = None
+) -> bool:
     """
-    Send a booking approval email with calendar link.
+    Render a booking email template and send it.
     
     Args:
+        template_name: Name of the template file
         booking_data: Booking information
-        mechanic_phone: Mechanic's phone number
+        subject: Subject line, formatted with the template data (e.g. "{service_name}")
+        extra: Additional template values, overriding booking_data
+        to_email: Recipient, defaulting to the booking's customer email
         
     Returns:
-        True if email was sent successfully
+        True if email was sent successfully, False otherwise
     """
     try:
-        # Add calendar link to template data
-        template_data = booking_data.copy()
-        template_data['mechanic_phone'] = mechanic_phone
-        template_data['calendar_link'] = generate_calendar_link(booking_data, mechanic_phone)
-        
-        subject = f"Appointment Confirmed - {booking_data['service_name']} on {booking_data['appointment_date']}"
-        html_content = render_email_template('approval.html', template_data)
-        
-        return send_email(
-            to_email=booking_data['customer_email'],
-            subject=subject,
-            html_content=html_content
+        data = {**booking_data, **extra} if extra else booking_data
+        return await send_email(
+            to_email=to_email or booking_data['customer_email'],
+            subject=subject.format_map(data),
+            html_content=render_email_template(template_name, data)
         )
-    except Exception as e:
-        logger.error(f"Failed to send approval email: {str(e)}")
+    except EmailServiceError:
+        logger.exception("Failed to send %s email", template_name)
         return False
 
-def send_denial_email(booking_data: Dict[str, Any]) -> bool:
-    """
-    Send a booking denial email.
-    
-    Args:
-        booking_data: Booking information
-        
-    Returns:
-        True if email was sent successfully
-    """
-    try:
-        config = get_email_config()
-        
-        # Add booking URL to template data
-        template_data = booking_data.copy()
-        template_data['booking_url'] = config['booking_url']
-        
-        subject = f"Booking Update - {booking_data['service_name']}"
-        html_content = render_email_template('denial.html', template_data)
-        
-        return send_email(
-            to_email=booking_data['customer_email'],
-            subject=subject,
-            html_content=html_content
-        )
-    except Exception as e:
-        logger.error(f"Failed to send denial email: {str(e)}")
-        return False
+async def send_confirmation_email(booking_data: Dict[str, Any]) -> bool:
+    """Send a booking confirmation email."""
+    return await _dispatch('confirmation.html', booking_data, "Booking Confirmation - {service_name}")
 
-def send_cancellation_email(booking_data: Dict[str, Any]) -> bool:
-    """
-    Send a booking cancellation confirmation email.
-    
-    Args:
-        booking_data: Booking information
-        
-    Returns:
-        True if email was sent successfully
-    """
-    try:
-        config = get_email_config()
-        
-        # Add booking URL to template data
-        template_data = booking_data.copy()
-        template_data['booking_url'] = config['booking_url']
-        
-        subject = f"Appointment Cancelled - {booking_data['service_name']}"
-        html_content = render_email_template('cancellation.html', template_data)
-        
-        return send_email(
-            to_email=booking_data['customer_email'],
-            subject=subject,
-            html_content=html_content
-        )
-    except Exception as e:
-        logger.error(f"Failed to send cancellation email: {str(e)}")
-        return False
+async def send_approval_email(booking_data: Dict[str, Any], mechanic_phone: str) -> bool:
+    """Send a booking approval email with calendar link."""
+    calendar_link = generate_calendar_link(booking_data, mechanic_phone, booking_data.get('duration_minutes') or 60)
+    return await _dispatch(
+        'approval.html', booking_data,
+        "Appointment Confirmed - {service_name} on {appointment_date}",
+        extra={'mechanic_phone': mechanic_phone, 'calendar_link': calendar_link}
+    )
 
-def send_reschedule_request_email(booking_data: Dict[str, Any]) -> bool:
-    """
-    Send a reschedule request confirmation email to customer and notification to admin.
+async def send_denial_email(booking_data: Dict[str, Any]) -> bool:
+    """Send a booking denial email."""
+    return await _dispatch(
+        'denial.html', booking_data, "Booking Update - {service_name}",
+        extra={'booking_url': (await _email_config())['booking_url']}
+    )
+
+async def send_cancellation_email(booking_data: Dict[str, Any]) -> bool:
+    """Send a booking cancellation confirmation email."""
+    return await _dispatch(
+        'cancellation.html', booking_data, "Appointment Cancelled - {service_name}",
+        extra={'booking_url': (await _email_config())['booking_url']}
+    )
+
+async def send_reschedule_request_email(booking_data: Dict[str, Any]) -> bool:
+    """Send a reschedule request confirmation email to customer and notification to admin."""
+    customer_success = await _dispatch(
+        'reschedule_request.html', booking_data, "Reschedule Request Received - {service_name}"
+    )
     
-    Args:
-        booking_data: Booking information
-        
-    Returns:
-        True if email was sent successfully
-    """
-    try:
-        # Send confirmation to customer
-        subject = f"Reschedule Request Received - {booking_data['service_name']}"
-        html_content = render_email_template('reschedule_request.html', booking_data)
-        
-        customer_success = send_email(
-            to_email=booking_data['customer_email'],
-            subject=subject,
-            html_content=html_content
-        )
-        
-        # Also send notification to admin/mechanic
-        # For now, we'll use a simple approach - in production you might want a separate admin email template
-        admin_subject = f"Reschedule Request - {booking_data['customer_name']} - {booking_data['service_name']}"
-        admin_html_content = render_email_template('reschedule_admin_notification.html', booking_data)
-        
-        # Send to a configured admin email or mechanic email
-        config = get_email_config()
-        admin_email = config.get('admin_email', 'admin@monkeyboigarage.com')  # You can add this to secret manager
-        
-        admin_success = send_email(
-            to_email=admin_email,
-            subject=admin_subject,
-            html_content=admin_html_content
-        )
-        
-        return customer_success and admin_success
-        
-    except Exception as e:
-        logger.error(f"Failed to send reschedule request email: {str(e)}")
-        return False
+    # Also send notification to a configured admin email or mechanic email
+    admin_email = (await _email_config()).get('admin_email', 'admin@monkeyboigarage.com')  # You can add this to secret manager
+    admin_success = await _dispatch(
+        'reschedule_admin_notification.html', booking_data,
+        "Reschedule Request - {customer_name} - {service_name}",
+        to_email=admin_email
+    )
+    
+    return customer_success and admin_success
 
-def send_customer_invitation_email(invitation_data: Dict[str, Any]) -> bool:
+async def send_customer_invitation_email(invitation_data: Dict[str, Any]) -> bool:
     """
     Send a customer invitation email with account credentials.
     
@@ -336,7 +367,7 @@ def send_customer_invitation_email(invitation_data: Dict[str, Any]) -> bool:
         True if email was sent successfully
     """
     try:
-        config = get_email_config()
+        config = await _email_config()
         
         # Prepare template data
         template_data = {
@@ -349,12 +380,12 @@ def send_customer_invitation_email(invitation_data: Dict[str, Any]) -> bool:
         subject = "Welcome! Your account has been created"
         html_content = render_email_template('customer_invitation.html', template_data)
         
-        return send_email(
+        return await send_email(
             to_email=invitation_data['customer_email'],
             subject=subject,
             html_content=html_content
         )
         
-    except Exception as e:
-        logger.error(f"Failed to send customer invitation email: {str(e)}")
+    except EmailServiceError:
+        logger.exception("Failed to send customer invitation email")
         return False
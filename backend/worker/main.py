@@ -1,9 +1,15 @@
-from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+import asyncio
+import ijson
 import logging
-import json
+from contextlib import asynccontextmanager
 import os
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
+import orjson
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from typing_extensions import TypedDict
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 from email_service import (
     send_confirmation_email, 
@@ -11,8 +17,12 @@ from email_service import (
     send_denial_email,
     send_cancellation_email,
     send_reschedule_request_email,
+    send_customer_invitation_email,
+    close_smtp_connection,
+    preload_email_config,
     EmailServiceError
 )
+from secret_manager import get_secret_manager_client
 
 # Configure logging
 logging.basicConfig(
@@ -21,104 +31,297 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Preload the email configuration on startup and close the shared SMTP connection on shutdown."""
+    # Build this process's Secret Manager client (credentials lookup) off the event loop.
+    # Without credentials, secret lookups fall back to environment variables instead.
+    try:
+        await run_in_threadpool(get_secret_manager_client)
+    except Exception as e:
+        logger.warning("Could not create Secret Manager client, using environment fallbacks: %s", e)
+    await preload_email_config()
+    yield
+    await close_smtp_connection()
+
 # Create FastAPI app
-app = FastAPI(title="Notification Worker")
+app = FastAPI(
+    title="Notification Worker",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
-class NotificationRequest(BaseModel):
+# A plain dict at runtime; pydantic only validates it inside NotificationBatch
+class NotificationRequest(TypedDict):
     booking_id: str
     notification_type: str
-    data: Dict[str, Any]
+    data: dict[str, Any]
+
+class NotificationBatch(BaseModel):
+    items: list[NotificationRequest] = Field(..., min_length=1, max_length=100)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Abandon a batch once this fraction of its items has failed
+BATCH_FAILURE_RATIO = 1 / 3
+
+# notification_type -> sender, called with (template_data, notification data)
+_HANDLERS: dict[str, Callable[[dict[str, Any], dict[str, Any]], Awaitable[bool]]] = {
+    "confirmation": lambda template_data, data: send_confirmation_email(template_data),
+    # The backend includes the mechanic phone number in template_data for approvals
+    "approval": lambda template_data, data: send_approval_email(
+        template_data, template_data.get("mechanic_phone", "Contact main office")
+    ),
+    "denial": lambda template_data, data: send_denial_email(template_data),
+    "cancellation": lambda template_data, data: send_cancellation_email(template_data),
+    "reschedule_request": lambda template_data, data: send_reschedule_request_email(template_data),
+    "customer_invitation": lambda template_data, data: send_customer_invitation_email(data),
+}
+
+# Valid notification types, derived from the handler table so the two can't drift
+KNOWN_TYPES = frozenset(_HANDLERS)
+
+# Acknowledge Cloud Tasks before sending. Off by default: on Cloud Run the send only
+# survives if CPU is always allocated (--no-cpu-throttling), and a failed send is not
+# retried by Cloud Tasks once the task has been acknowledged.
+SEND_IN_BACKGROUND = os.environ.get("SEND_IN_BACKGROUND", "false").lower() == "true"
+
+# Types still sent before acknowledging, so a failure reaches Cloud Tasks as a 500 and is retried
+INLINE_TYPES = frozenset({"customer_invitation"})
+
+# Seconds to wait between in-process retries of a failed background send
+BACKGROUND_RETRY_DELAYS = (2, 10, 30)
+
+# Static endpoint bodies, serialized once instead of on every probe
+_HEALTH_BYTES = orjson.dumps({"status": "ok"})
+_VERSION_BYTES = orjson.dumps({"version": os.environ.get("VERSION", "dev")})
+
+async def _parse_body(request: Request, model: type[ModelT]) -> ModelT:
+    """
+    Parse and validate a raw JSON request body in a single pass.
+    
+    Raises:
+        HTTPException: 400 if the body is not valid JSON, 422 if it fails validation
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        # An undecodable body is reported as the only error
+        if errors[0]["type"] == "json_invalid":
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {errors[0]['msg']}")
+        raise HTTPException(status_code=422, detail=errors)
+
+# Batch bodies larger than this are parsed incrementally as they stream in
+STREAM_BODY_THRESHOLD = 32 * 1024
+
+async def _parse_batch(request: Request) -> NotificationBatch:
+    """
+    Parse and validate a notification batch.
+    
+    Small bodies are validated in one pass from the buffered body; large ones
+    are fed chunk by chunk to an incremental parser so the raw body is never
+    held in memory alongside the decoded items.
+    
+    Raises:
+        HTTPException: 400 if the body is not valid JSON, 422 if it fails validation
+    """
+    content_length = request.headers.get("content-length", "")
+    if not content_length.isdigit() or int(content_length) <= STREAM_BODY_THRESHOLD:
+        return await _parse_body(request, NotificationBatch)
+    
+    items = ijson.sendable_list()
+    parser = ijson.items_coro(items, "items.item", use_float=True)
+    try:
+        async for chunk in request.stream():
+            # The stream ends with an empty chunk, which would close the parser early
+            if chunk:
+                parser.send(chunk)
+        parser.close()
+        return NotificationBatch.model_validate({"items": items})
+    except ijson.JSONError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def _check_notification(payload: Any) -> NotificationRequest:
+    """
+    Check the shape of a decoded notification payload.
+    
+    Raises:
+        HTTPException: 422 if a required field is missing or has the wrong type
+    """
+    if not (
+        isinstance(payload, dict)
+        and isinstance(payload.get("booking_id"), str)
+        and isinstance(payload.get("notification_type"), str)
+        and isinstance(payload.get("data"), dict)
+    ):
+        raise HTTPException(
+            status_code=422,
+            detail="Notification requires string booking_id and notification_type and an object data",
+        )
+    return payload
 
 @app.get("/healthz")
 async def health_check():
     """Health check endpoint for the worker service."""
-    return {"status": "ok"}
+    return Response(_HEALTH_BYTES, media_type="application/json")
 
 @app.get("/version")
 async def version():
     """Version endpoint for the worker service."""
-    return {"version": os.environ.get("VERSION", "dev")}
+    return Response(_VERSION_BYTES, media_type="application/json")
+
+async def _send_notification(notification: NotificationRequest) -> dict[str, str]:
+    """
+    Send the email for a single notification.
+    
+    Returns the status payload for the notification.
+    
+    Raises:
+        EmailServiceError: If the email could not be sent
+    """
+    booking_id = notification["booking_id"]
+    data = notification["data"]
+    
+    # Log the notification details
+    logger.info("Processing notification for booking %s", booking_id)
+    logger.info("Notification type: %s", notification["notification_type"])
+    
+    # Reject unknown types before looking at the email payload
+    notification_type = data.get("notification_type", "confirmation")
+    if notification_type not in KNOWN_TYPES:
+        logger.warning("Unknown notification type: %s", notification_type)
+        return {"status": "error", "message": f"Unknown notification type: {notification_type}"}
+    
+    # Extract email data
+    email_data = data.get("email")
+    if not email_data:
+        logger.warning("No email data found for booking %s", booking_id)
+        return {"status": "success", "message": "No email to send"}
+    
+    # Get template data from email payload
+    template_data = email_data.get("template_data", {})
+    
+    # Send email based on notification type
+    email_sent = await _HANDLERS[notification_type](template_data, data)
+    
+    if not email_sent:
+        logger.error("Failed to send email for booking %s", booking_id)
+        raise EmailServiceError("Email sending failed")
+    
+    logger.info("Email sent successfully for booking %s", booking_id)
+    return {"status": "success", "message": "Email sent successfully"}
+
+async def _send_in_background(notification: NotificationRequest) -> None:
+    """Send a notification after its task was acknowledged, retrying in-process on failure."""
+    booking_id = notification["booking_id"]
+    for delay in (*BACKGROUND_RETRY_DELAYS, None):
+        try:
+            await _send_notification(notification)
+            return
+        except Exception as e:
+            if delay is None:
+                # The task was already acknowledged, so the email is lost. Alerting matches
+                # on the "Notification dropped" prefix, so keep it stable.
+                logger.error(
+                    "Notification dropped for booking %s (%s) after %s attempts: %s",
+                    booking_id,
+                    notification["notification_type"],
+                    len(BACKGROUND_RETRY_DELAYS) + 1,
+                    e,
+                    exc_info=e,
+                )
+                return
+            logger.warning("Notification for booking %s failed, retrying in %ss: %s", booking_id, delay, e)
+            await asyncio.sleep(delay)
 
 @app.post("/process-notification")
-async def process_notification(request: Request):
+async def process_notification(request: Request, background_tasks: BackgroundTasks):
     """
     Process notification tasks from Cloud Tasks.
     
     This endpoint:
-    1. Parses the notification task payload
-    2. Sends actual emails using SMTP2GO
+    1. Parses and checks the notification task payload
+    2. Sends actual emails using SMTP2GO, after acknowledging the task
+       unless background sending is disabled or the type is in INLINE_TYPES
     3. Returns HTTP 200 to acknowledge the task
     
     Returns HTTP 200 to acknowledge the task.
     """
     try:
-        # Parse the request body
-        body = await request.body()
-        payload = json.loads(body)
-        
-        notification = NotificationRequest(**payload)
-        
-        # Log the notification details
-        logger.info(f"Processing notification for booking {notification.booking_id}")
-        logger.info(f"Notification type: {notification.notification_type}")
-        
-        # Extract email data
-        email_data = notification.data.get("email")
-        if not email_data:
-            logger.warning(f"No email data found for booking {notification.booking_id}")
-            return {"status": "success", "message": "No email to send"}
-        
-        # Get template data from email payload
-        template_data = email_data.get("template_data", {})
-        
-        # Send email based on notification type
-        email_sent = False
-        notification_type = notification.data.get("notification_type", "confirmation")
-        
-        try:
-            if notification_type == "confirmation":
-                email_sent = send_confirmation_email(template_data)
-            elif notification_type == "approval":
-                # For approval emails, we need the mechanic phone number
-                # This should be included in the template_data by the backend
-                mechanic_phone = template_data.get("mechanic_phone", "Contact main office")
-                email_sent = send_approval_email(template_data, mechanic_phone)
-            elif notification_type == "denial":
-                email_sent = send_denial_email(template_data)
-            elif notification_type == "cancellation":
-                email_sent = send_cancellation_email(template_data)
-            elif notification_type == "reschedule_request":
-                email_sent = send_reschedule_request_email(template_data)
-            elif notification_type == "customer_invitation":
-                # Handle customer invitation emails
-                email_sent = send_customer_invitation_email(notification.data)
-            else:
-                logger.warning(f"Unknown notification type: {notification_type}")
-                return {"status": "error", "message": f"Unknown notification type: {notification_type}"}
-            
-            if email_sent:
-                logger.info(f"Email sent successfully for booking {notification.booking_id}")
-                return {"status": "success", "message": "Email sent successfully"}
-            else:
-                logger.error(f"Failed to send email for booking {notification.booking_id}")
-                raise HTTPException(status_code=500, detail="Email sending failed")
-                
-        except EmailServiceError as e:
-            logger.error(f"Email service error for booking {notification.booking_id}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Email service error: {str(e)}")
-        
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in request body: {str(e)}")
-        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    
+    notification = _check_notification(payload)
+    
+    notification_type = notification["data"].get("notification_type", "confirmation")
+    if SEND_IN_BACKGROUND and notification_type not in INLINE_TYPES:
+        background_tasks.add_task(_send_in_background, notification)
+        return ORJSONResponse({"status": "accepted", "message": "Email queued for sending"})
+    
+    try:
+        result = await _send_notification(notification)
+    except EmailServiceError as e:
+        logger.error("Email service error for booking %s: %s", notification["booking_id"], e)
+        raise HTTPException(status_code=500, detail=f"Email service error: {str(e)}")
     except Exception as e:
-        logger.error(f"Error processing notification: {str(e)}")
+        logger.error("Error processing notification: %s", e)
         # Return 500 to trigger a retry
         raise HTTPException(status_code=500, detail=f"Error processing notification: {str(e)}")
+    
+    # An "error" result (e.g. an unknown type) can never succeed, so it is acknowledged
+    # with a 200 rather than retried
+    return ORJSONResponse(result)
+
+@app.post("/process-notifications-batch")
+async def process_notifications_batch(request: Request):
+    """
+    Process a batch of notification tasks over one reused SMTP connection.
+    
+    Each item is handled independently so one bad recipient doesn't abort the
+    batch, but processing stops once a third of the items have failed and the
+    remaining items are reported as skipped.
+    
+    Returns a per-item status list.
+    """
+    batch = await _parse_batch(request)
+    max_failures = max(1, int(len(batch.items) * BATCH_FAILURE_RATIO))
+    failures = 0
+    results = []
+    
+    for index, notification in enumerate(batch.items):
+        try:
+            result = await _send_notification(notification)
+        except Exception as e:
+            logger.error("Error processing notification for booking %s: %s", notification["booking_id"], e)
+            result = {"status": "failed", "message": str(e)}
+            failures += 1
+        results.append({"booking_id": notification["booking_id"], **result})
+        
+        if failures >= max_failures:
+            logger.error("Aborting notification batch after %s failures", failures)
+            results.extend(
+                {"booking_id": skipped["booking_id"], "status": "skipped", "message": "Batch aborted"}
+                for skipped in batch.items[index + 1:]
+            )
+            break
+    
+    return ORJSONResponse({"status": "success" if failures == 0 else "partial", "results": results})
 
 if __name__ == "__main__":
+    is_dev = os.environ.get("ENV", "production") != "production"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=int(os.environ.get("PORT", 8080)),
-        reload=os.environ.get("ENV", "production") != "production",
+        loop="uvloop",
+        http="httptools",
+        # Per-request access logs dominate CPU for /healthz; keep them for local dev only
+        access_log=is_dev,
+        reload=is_dev,
+        # Cloud Run scales instances itself; opt into extra processes per instance via WEB_CONCURRENCY
+        workers=1 if is_dev else int(os.environ.get("WEB_CONCURRENCY", 1)),
     )
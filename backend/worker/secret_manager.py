@@ -3,23 +3,146 @@ Secret Manager utility for accessing GCP secrets.
 """
 import os
 import logging
-from typing import Optional
+import threading
+from typing import TYPE_CHECKING, Optional
+from cachetools import TTLCache
 from google.cloud import secretmanager
 from functools import lru_cache
 
+if TYPE_CHECKING:
+    import redis
+    from cryptography.fernet import Fernet
+
 logger = logging.getLogger(__name__)
 
+# Default project for secret lookups, fixed for the life of the process
+PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+
+# Ping idle gRPC connections so later lookups reuse the channel instead of re-handshaking
+GRPC_CHANNEL_OPTIONS = (
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+)
+
 # Initialize the Secret Manager client
 @lru_cache(maxsize=1)
 def get_secret_manager_client():
-    """Get Secret Manager client with caching."""
-    return secretmanager.SecretManagerServiceClient()
+    """
+    Get Secret Manager client with caching.
+    
+    Each worker process builds its own client (gRPC channels must not be
+    shared across fork), so the worker warms it up in its startup hook.
+    """
+    transport_cls = secretmanager.SecretManagerServiceClient.get_transport_class("grpc")
+    channel = transport_cls.create_channel(options=GRPC_CHANNEL_OPTIONS)
+    return secretmanager.SecretManagerServiceClient(transport=transport_cls(channel=channel))
+
+@lru_cache(maxsize=1)
+def get_async_secret_manager_client():
+    """
+    Get the asyncio Secret Manager client with caching.
+    
+    The channel is bound to the running event loop, so call this from within it.
+    """
+    transport_cls = secretmanager.SecretManagerServiceAsyncClient.get_transport_class("grpc_asyncio")
+    channel = transport_cls.create_channel(options=GRPC_CHANNEL_OPTIONS)
+    return secretmanager.SecretManagerServiceAsyncClient(transport=transport_cls(channel=channel))
+
+# Seconds a fetched secret is reused before it is read again, so rotated secrets are picked up without a restart
+SECRET_TTL_SECONDS = 600
+
+# Per-process secret cache keyed by resource name
+_secret_cache: TTLCache = TTLCache(maxsize=32, ttl=SECRET_TTL_SECONDS)
+_secret_cache_lock = threading.Lock()
+
+# Optional Redis cache shared by sibling worker processes, so only one of them pays
+# the Secret Manager round-trip. Values are Fernet-encrypted with SECRET_CACHE_KEY and
+# kept for half the per-process TTL; the shared cache is off unless both are set.
+REDIS_URL = os.environ.get("REDIS_URL")
+SECRET_CACHE_KEY = os.environ.get("SECRET_CACHE_KEY")
+SHARED_SECRET_TTL_SECONDS = SECRET_TTL_SECONDS // 2
+
+@lru_cache(maxsize=1)
+def get_shared_cache() -> Optional["redis.Redis"]:
+    """Get the shared Redis client, or None when REDIS_URL or SECRET_CACHE_KEY is not configured."""
+    if not (REDIS_URL and SECRET_CACHE_KEY):
+        return None
+    import redis
+    return redis.Redis.from_url(REDIS_URL)
+
+@lru_cache(maxsize=1)
+def _shared_cache_cipher() -> "Fernet":
+    """Cipher for values in the shared cache, keyed by SECRET_CACHE_KEY."""
+    from cryptography.fernet import Fernet
+    return Fernet(SECRET_CACHE_KEY)
+
+def _read_shared_secret(key: str) -> Optional[str]:
+    """Best-effort read and decrypt of a secret from the shared cache."""
+    import redis
+    from cryptography.fernet import InvalidToken
+    
+    try:
+        token = get_shared_cache().get(key)
+    except redis.RedisError as e:
+        logger.warning("Could not read %s from the shared secret cache: %s", key, e)
+        return None
+    if token is None:
+        return None
+    
+    try:
+        # The token's own timestamp bounds its age even if the Redis expiry was not applied
+        return _shared_cache_cipher().decrypt(token, ttl=SHARED_SECRET_TTL_SECONDS).decode("UTF-8")
+    except InvalidToken:
+        logger.warning("Ignoring expired or undecryptable shared cache entry for %s", key)
+        return None
+
+def _write_shared_secret(key: str, value: str) -> None:
+    """Best-effort encrypted write of a secret to the shared cache."""
+    import redis
+    
+    token = _shared_cache_cipher().encrypt(value.encode("UTF-8"))
+    try:
+        get_shared_cache().set(key, token, ex=SHARED_SECRET_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning("Could not write %s to the shared secret cache: %s", key, e)
+
+def _secret_path(secret_name: str, project_id: Optional[str]) -> str:
+    """Return the resource name of the latest version of a secret."""
+    project_id = project_id or PROJECT_ID
+    if not project_id:
+        raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set")
+    return f"projects/{project_id}/secrets/{secret_name}/versions/latest"
+
+def _cached_secret(name: str) -> Optional[str]:
+    """Look a secret up in the per-process cache, then the shared cache if configured."""
+    with _secret_cache_lock:
+        cached = _secret_cache.get(name)
+    if cached is not None or not get_shared_cache():
+        return cached
+    
+    cached = _read_shared_secret(name)
+    if cached is None:
+        logger.info("Shared secret cache miss", extra={"secret_name": name})
+        return None
+    with _secret_cache_lock:
+        _secret_cache[name] = cached
+    return cached
+
+def _cache_secret(name: str, value: str) -> None:
+    """Store a freshly fetched secret in the per-process and shared caches."""
+    with _secret_cache_lock:
+        _secret_cache[name] = value
+    if get_shared_cache():
+        _write_shared_secret(name, value)
 
-@lru_cache(maxsize=32)
 def get_secret(secret_name: str, project_id: Optional[str] = None) -> str:
     """
     Retrieve a secret from Google Cloud Secret Manager.
     
+    Values are cached for 10 minutes; one taken from the shared cache may be
+    up to 5 minutes older. The cache lock is not held during the Secret
+    Manager call, so concurrent misses may fetch the same secret twice.
+    
     Args:
         secret_name: Name of the secret to retrieve
         project_id: GCP project ID (defaults to GOOGLE_CLOUD_PROJECT env var)
@@ -30,26 +153,64 @@ def get_secret(secret_name: str, project_id: Optional[str] = None) -> str:
     Raises:
         Exception: If secret cannot be retrieved
     """
-    if not project_id:
-        project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
-        if not project_id:
-            raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set")
+    name = _secret_path(secret_name, project_id)
+    cached = _cached_secret(name)
+    if cached is not None:
+        return cached
     
     try:
         client = get_secret_manager_client()
-        name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
         
-        logger.debug(f"Retrieving secret: {secret_name}")
+        logger.debug("Retrieving secret: %s", secret_name)
         response = client.access_secret_version(request={"name": name})
         
         secret_value = response.payload.data.decode("UTF-8")
-        logger.debug(f"Successfully retrieved secret: {secret_name}")
+        logger.debug("Successfully retrieved secret: %s", secret_name)
+        
+    except Exception as e:
+        logger.error("Failed to retrieve secret %s: %s", secret_name, e)
+        raise Exception(f"Failed to retrieve secret {secret_name}: {str(e)}")
+    
+    _cache_secret(name, secret_value)
+    return secret_value
+
+async def get_secret_async(secret_name: str, project_id: Optional[str] = None) -> str:
+    """
+    Retrieve a secret without blocking the event loop.
+    
+    Same as get_secret, sharing its caches, but the Secret Manager call goes
+    through the asyncio client so several lookups can be awaited together.
+    
+    Args:
+        secret_name: Name of the secret to retrieve
+        project_id: GCP project ID (defaults to GOOGLE_CLOUD_PROJECT env var)
+        
+    Returns:
+        Secret value as string
+        
+    Raises:
+        Exception: If secret cannot be retrieved
+    """
+    name = _secret_path(secret_name, project_id)
+    cached = _cached_secret(name)
+    if cached is not None:
+        return cached
+    
+    try:
+        client = get_async_secret_manager_client()
         
-        return secret_value
+        logger.debug("Retrieving secret: %s", secret_name)
+        response = await client.access_secret_version(request={"name": name})
+        
+        secret_value = response.payload.data.decode("UTF-8")
+        logger.debug("Successfully retrieved secret: %s", secret_name)
         
     except Exception as e:
-        logger.error(f"Failed to retrieve secret {secret_name}: {str(e)}")
+        logger.error("Failed to retrieve secret %s: %s", secret_name, e)
         raise Exception(f"Failed to retrieve secret {secret_name}: {str(e)}")
+    
+    _cache_secret(name, secret_value)
+    return secret_value
 
 def get_secret_or_env(secret_name: str, env_var_name: str, default: Optional[str] = None) -> Optional[str]:
     """
@@ -68,21 +229,21 @@ def get_secret_or_env(secret_name: str, env_var_name: str, default: Optional[str
     try:
         # Try Secret Manager first
         value = get_secret(secret_name)
-        logger.info(f"Retrieved {secret_name} from Google Cloud Secret Manager")
+        logger.info("Retrieved %s from Google Cloud Secret Manager", secret_name)
         return value
     except Exception as e:
-        logger.warning(f"Could not retrieve secret {secret_name}: {str(e)}")
+        logger.warning("Could not retrieve secret %s: %s", secret_name, e)
         
         # Fall back to environment variable
         env_value = os.environ.get(env_var_name)
         if env_value:
-            logger.info(f"Using environment variable {env_var_name} as fallback for {secret_name}")
+            logger.info("Using environment variable %s as fallback for %s", env_var_name, secret_name)
             return env_value
         
         # Use default if provided
         if default is not None:
-            logger.info(f"Using default value for {secret_name}")
+            logger.info("Using default value for %s", secret_name)
             return default
         
-        logger.error(f"No value found for {secret_name} in Secret Manager, environment, or default")
+        logger.error("No value found for %s in Secret Manager, environment, or default", secret_name)
         return None
\ No newline at end of file